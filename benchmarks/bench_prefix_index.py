@@ -0,0 +1,109 @@
+"""Micro-benchmark: PrefixIndex lookups vs. per-IP parent-prefix checks.
+
+Standalone (no Nautobot needed) it compares the index against a linear containment
+scan over synthetic prefixes:
+
+    python benchmarks/bench_prefix_index.py --ips 10000 --prefixes 2000
+
+With ``--orm`` it runs inside a configured Nautobot environment and times the query the
+sync job used to issue per IP, ``Prefix.objects.filter(network__net_contains_or_equals=...)
+.exists()``, against an index loaded from the same database:
+
+    NAUTOBOT_CONFIG=/opt/nautobot/nautobot_config.py python benchmarks/bench_prefix_index.py --orm
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "jobs"))
+
+from prefix_index import PrefixIndex  # noqa: E402
+
+FakePrefix = namedtuple("FakePrefix", "network prefix_length")
+
+
+def synthetic_prefixes(count, seed):
+    rng = random.Random(seed)
+    prefixes = {FakePrefix("10.0.0.0", 8)}
+    while len(prefixes) < count:
+        length = rng.choice((16, 20, 22, 24, 24, 24, 26, 28))
+        net = ipaddress.ip_network(f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/{length}", strict=False)
+        prefixes.add(FakePrefix(str(net.network_address), length))
+    return list(prefixes)
+
+
+def synthetic_ips(count, seed, orm_networks=None):
+    rng = random.Random(seed + 1)
+    if orm_networks:
+        # Draw addresses from real prefixes so most lookups hit, plus some misses
+        ips = []
+        for _ in range(count):
+            net = rng.choice(orm_networks)
+            ips.append(str(net.network_address + rng.randrange(net.num_addresses)) if rng.random() < 0.9 else f"198.51.100.{rng.randrange(256)}")
+        return ips
+    return [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" if rng.random() < 0.9 else f"192.0.2.{rng.randrange(256)}" for _ in range(count)]
+
+
+def timed(label, func, ips):
+    start = time.perf_counter()
+    hits = sum(1 for ip in ips if func(ip))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed * 1000:10.1f} ms  {elapsed / len(ips) * 1e6:9.2f} us/ip  hits={hits}")
+    return elapsed
+
+
+def bench_standalone(args):
+    prefixes = synthetic_prefixes(args.prefixes, args.seed)
+    ips = synthetic_ips(args.ips, args.seed)
+
+    start = time.perf_counter()
+    index = PrefixIndex(prefixes)
+    print(f"{'build index':<34} {(time.perf_counter() - start) * 1000:10.1f} ms  ({len(index)} prefixes)")
+
+    networks = [ipaddress.ip_network(f"{p.network}/{p.prefix_length}") for p in prefixes]
+    linear = timed("linear scan (per-IP containment)", lambda ip: any(ipaddress.ip_address(ip) in n for n in networks), ips)
+    indexed = timed("PrefixIndex.lookup", index.lookup, ips)
+    print(f"speedup: {linear / indexed:.0f}x")
+
+
+def bench_orm(args):
+    import nautobot
+
+    nautobot.setup()
+    from nautobot.ipam.models import Prefix, get_default_namespace
+
+    queryset = Prefix.objects.filter(namespace=get_default_namespace())
+    networks = [ipaddress.ip_network(f"{p.network}/{p.prefix_length}") for p in queryset]
+    if not networks:
+        sys.exit("No prefixes in the default namespace to benchmark against")
+    ips = synthetic_ips(args.ips, args.seed, orm_networks=networks)
+
+    start = time.perf_counter()
+    index = PrefixIndex.from_queryset(queryset)
+    build = time.perf_counter() - start
+    print(f"{'load + build index':<34} {build * 1000:10.1f} ms  ({len(index)} prefixes)")
+
+    query = timed("Prefix...exists() per IP", lambda ip: Prefix.objects.filter(network__net_contains_or_equals=ip).exists(), ips)
+    indexed = timed("PrefixIndex.lookup", index.lookup, ips)
+    print(f"speedup (including index build): {query / (indexed + build):.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ips", type=int, default=10000)
+    parser.add_argument("--prefixes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--orm", action="store_true", help="Compare against the Prefix query path in a Nautobot DB")
+    args = parser.parse_args()
+    if args.orm:
+        bench_orm(args)
+    else:
+        bench_standalone(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Synthetic-scale benchmark: run Sync Proxmox Inventory against a local mock Proxmox API.
+
+Starts mock_proxmox.MockProxmoxServer in-process, runs the installed job through
+Nautobot's job runner and reports wall time, SQL query count, mock API request count
+and peak RSS for each run:
+
+    NAUTOBOT_CONFIG=/opt/nautobot/nautobot_config.py \\
+        python benchmarks/bench_proxmox_sync.py --nodes 4 --vms 500 --ips 2 --latency-ms 15 --repeat 2
+
+Point NAUTOBOT_CONFIG at a throwaway test database: with ``--commit`` the job writes the
+synthetic cluster ("HomeLab Proxmox") into it. ``--repeat`` re-runs the job against the
+same data, which shows the unchanged-VM fast path. Job options such as
+``--no-cluster-resources`` or ``--max-workers`` let modes be compared on equal input.
+"""
+import argparse
+import resource
+import sys
+import time
+
+from mock_proxmox import add_cluster_args, server_from_args
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def ensure_prefix(cidr):
+    from nautobot.extras.models import Status
+    from nautobot.ipam.models import Prefix, get_default_namespace
+
+    status = Status.objects.get(name="Active")
+    network, length = cidr.split("/")
+    Prefix.objects.get_or_create(
+        network=network, prefix_length=int(length), namespace=get_default_namespace(), defaults={"status": status}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_args(parser)
+    parser.add_argument("--repeat", type=int, default=1, help="Run the job this many times against the same mock cluster")
+    parser.add_argument("--commit", action="store_true", help="Let the job write to the database (default: dry run)")
+    parser.add_argument("--force-full", action="store_true")
+    parser.add_argument("--no-cluster-resources", action="store_true", help="List guests per node instead of via /cluster/resources")
+    parser.add_argument("--incremental", action="store_true", help="Use task-log driven incremental mode (first run is full)")
+    parser.add_argument("--touch", type=int, default=0, help="Incremental mode: guests given a new task before each repeat run")
+    parser.add_argument("--detail-pass", action="store_true", help="Fetch every guest config and record disks/NICs/CPU (repeat runs skip unchanged digests)")
+    parser.add_argument("--arp-ips", action="store_true", help="Walk the pfSense ARP table for agentless guests (needs SNMP access to it)")
+    parser.add_argument("--sharded", action="store_true", help="Dispatch per-node shards (needs running Celery workers)")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--node-concurrency", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--api-retries", type=int, default=3)
+    parser.add_argument("--agent-retry-ttl", type=int, default=0, help="Guest-agent negative cache TTL (0 keeps runs comparable)")
+    parser.add_argument("--prefix", default="10.0.0.0/8", help="Parent prefix to create so synced IPs can be linked ('' to skip)")
+    parser.add_argument("--username", default="benchmark")
+    args = parser.parse_args()
+
+    import nautobot
+
+    nautobot.setup()
+    from django.db import connection
+    from nautobot.apps.testing import run_job_for_testing
+    from nautobot.extras.models import Job as JobModel
+
+    job_model = JobModel.objects.filter(job_class_name="SyncProxmoxInventory").first()
+    if job_model is None:
+        sys.exit("SyncProxmoxInventory is not installed in this Nautobot database (sync the Git repository first)")
+    if args.commit and args.prefix:
+        ensure_prefix(args.prefix)
+
+    server = server_from_args(args).start()
+    if args.incremental:
+        # The task log needs at least one entry for the first (full) run to set a watermark
+        server.cluster.add_task(next(iter(server.cluster.guests)), "qmstart", time.time() - 60)
+    print(f"Mock cluster: {args.nodes} nodes x {args.vms} guests x {args.ips} IPs ({len(server.cluster.guests)} guests) at {server.base_url}")
+    print(f"{'run':>3} {'status':<10} {'wall s':>8} {'queries':>8} {'api reqs':>8} {'errors':>6} {'peak RSS MB':>11}")
+    try:
+        for run in range(1, args.repeat + 1):
+            if run > 1 and args.touch:
+                for vmid in list(server.cluster.guests)[: args.touch]:
+                    server.cluster.add_task(vmid, "qmstart")
+            requests_before = server.total_requests()
+            errors_before = server.errors_injected
+            counter = QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                job_result = run_job_for_testing(
+                    job_model,
+                    username=args.username,
+                    proxmox_url=server.base_url,
+                    proxmox_user="bench@pve!bench",
+                    proxmox_token="benchmark",
+                    commit=args.commit,
+                    mark_stale=True,
+                    force_full=args.force_full,
+                    include_lxc=True,
+                    node_filter="",
+                    vmid_filter="",
+                    incremental=args.incremental,
+                    full_every_hours=24,
+                    sharded=args.sharded,
+                    max_workers=args.max_workers,
+                    node_concurrency=args.node_concurrency,
+                    chunk_size=args.chunk_size,
+                    use_cluster_resources=not args.no_cluster_resources,
+                    agent_retry_ttl=args.agent_retry_ttl,
+                    arp_ips=args.arp_ips,
+                    detail_pass=args.detail_pass,
+                    api_retries=args.api_retries,
+                )
+            wall = time.perf_counter() - start
+            print(
+                f"{run:>3} {job_result.status:<10} {wall:8.2f} {counter.count:8d} "
+                f"{server.total_requests() - requests_before:8d} {server.errors_injected - errors_before:6d} {peak_rss_mb():11.1f}"
+            )
+        print("API requests by route: " + ", ".join(f"{route}={count}" for route, count in sorted(server.requests.items())))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
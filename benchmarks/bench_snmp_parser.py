@@ -0,0 +1,97 @@
+"""Benchmark: buffered vs. streaming parsing of a large SNMP walk.
+
+Writes a synthetic dot1dTpFdbPort walk (default 100k rows, ``snmpwalk -On`` format) to
+a temporary file and feeds it through a subprocess (``cat``) the same way a walk's
+stdout arrives:
+
+* buffered: ``check_output().decode()`` plus a dict of the whole table, then the MAC
+  reduction (what DiscoverPhysicalCables.snmp_walk used to do)
+* streaming: ``snmp.stream_command`` typed rows reduced one at a time
+
+Reports wall time, time to the first usable row and peak traced Python memory:
+
+    python benchmarks/bench_snmp_parser.py --rows 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "jobs"))
+
+from snmp import stream_command  # noqa: E402
+
+FDB_OID = ".1.3.6.1.2.1.17.4.3.1.2"
+
+
+def write_fixture(path, rows):
+    with open(path, "w") as fh:
+        for i in range(rows):
+            mac = ".".join(str(b) for b in (0xBC, 0x24, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF, 7))
+            fh.write(f"{FDB_OID}.{mac} = INTEGER: {i % 48 + 1}\n")
+
+
+def reduce_row(mac_to_port, index, port):
+    parts = index.split(".")
+    if len(parts) == 6:
+        mac_to_port[":".join(f"{int(x):02X}" for x in parts)] = str(port)
+
+
+def buffered(path):
+    first = None
+    start = time.perf_counter()
+    output = subprocess.check_output(["cat", path]).decode()
+    results = {}
+    for line in output.splitlines():
+        if " = " in line:
+            key, val = line.split(" = ", 1)
+            results[key.replace(FDB_OID, "").strip(".")] = val.split(": ", 1)[-1].strip('" ')
+    mac_to_port = {}
+    for index, port in results.items():
+        if first is None:
+            first = time.perf_counter() - start
+        reduce_row(mac_to_port, index, port)
+    return mac_to_port, first
+
+
+def streaming(path):
+    first = None
+    start = time.perf_counter()
+    mac_to_port = {}
+    for index, port in stream_command(["cat", path], FDB_OID):
+        if first is None:
+            first = time.perf_counter() - start
+        reduce_row(mac_to_port, index, port)
+    return mac_to_port, first
+
+
+def measure(label, func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result, first = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {elapsed * 1000:9.1f} ms  first row {first * 1000:8.1f} ms  peak {peak / 2 ** 20:7.1f} MiB  rows={len(result)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fdb.walk")
+        write_fixture(path, args.rows)
+        print(f"fixture: {args.rows} rows, {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+        expected = measure("buffered", buffered, path)
+        got = measure("streaming", streaming, path)
+        assert got == expected, "streaming result differs from buffered result"
+
+
+if __name__ == "__main__":
+    main()
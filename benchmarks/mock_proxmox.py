@@ -0,0 +1,268 @@
+"""Local mock of the Proxmox VE ``/api2/json`` endpoints used by jobs/proxmox_sync.py.
+
+Generates a synthetic cluster of N nodes x M guests x K IPs per guest and serves it over
+plain HTTP, with optional per-request latency and error injection. Used by
+bench_proxmox_sync.py, or standalone to point a Nautobot dev instance at:
+
+    python benchmarks/mock_proxmox.py --nodes 4 --vms 250 --ips 2 --latency-ms 20 --port 8006
+
+Authentication is not checked; any PVEAPIToken header is accepted.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+_ROUTES = [
+    (re.compile(r"^/nodes$"), "nodes"),
+    (re.compile(r"^/cluster/resources$"), "cluster_resources"),
+    (re.compile(r"^/cluster/tasks$"), "cluster_tasks"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/tasks$"), "node_tasks"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/network$"), "network"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/(?P<vm_type>qemu|lxc)$"), "guests"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/(?P<vm_type>qemu|lxc)/(?P<vmid>\d+)/config$"), "config"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/qemu/(?P<vmid>\d+)/agent/network-get-interfaces$"), "agent"),
+    (re.compile(r"^/nodes/(?P<node>[^/]+)/lxc/(?P<vmid>\d+)/interfaces$"), "lxc_interfaces"),
+]
+
+
+class MockCluster:
+    """Deterministic synthetic inventory; guest IPs are 10.<node>.<vm>.<ip> style addresses."""
+
+    def __init__(self, nodes=3, vms=100, ips=2, lxc_ratio=0.3, agent_ratio=0.8, stopped_ratio=0.1, seed=42):
+        rng = random.Random(seed)
+        self.nodes = [f"pve{n + 1:02d}" for n in range(nodes)]
+        self.guests = {}  # vmid -> guest dict (with "node" and "type")
+        vmid = 100
+        for n, node in enumerate(self.nodes):
+            for v in range(vms):
+                vm_type = "lxc" if rng.random() < lxc_ratio else "qemu"
+                running = rng.random() >= stopped_ratio
+                self.guests[vmid] = {
+                    "vmid": vmid,
+                    "name": f"{node}-{vm_type}-{v:05d}",
+                    "node": node,
+                    "type": vm_type,
+                    "status": "running" if running else "stopped",
+                    "maxcpu": rng.choice((1, 2, 4, 8)),
+                    "maxmem": rng.choice((1, 2, 4, 8, 16)) * 1024 ** 3,
+                    "maxdisk": rng.choice((8, 16, 32, 64)) * 1024 ** 3,
+                    "agent": vm_type == "qemu" and rng.random() < agent_ratio,
+                    "ips": [f"10.{n % 256}.{(v * ips + i) // 254 % 256}.{(v * ips + i) % 254 + 1}" for i in range(ips)],
+                }
+                vmid += 1
+        # Task log entries as /cluster/tasks returns them; append to simulate guest operations
+        self.tasks = []
+
+    def add_task(self, vmid, task_type, starttime=None):
+        g = self.guests[vmid]
+        start = int(starttime or time.time())
+        self.tasks.append({
+            "upid": f"UPID:{g['node']}:{len(self.tasks):08X}:{start:08X}:{task_type}:{vmid}:root@pam:",
+            "node": g["node"], "type": task_type, "id": str(vmid), "user": "root@pam",
+            "starttime": start, "endtime": start + 1, "status": "OK",
+        })
+
+    def _mac(self, vmid, index):
+        return "BC:24:11:{:02X}:{:02X}:{:02X}".format((vmid >> 8) & 0xFF, vmid & 0xFF, index)
+
+    # Handlers return the "data" member of the Proxmox response
+    def nodes_list(self):
+        return [{"node": node, "status": "online", "type": "node"} for node in self.nodes]
+
+    def cluster_resources(self):
+        return [
+            {k: g[k] for k in ("vmid", "name", "node", "type", "status", "maxcpu", "maxmem", "maxdisk")} | {"id": f"{g['type']}/{g['vmid']}"}
+            for g in self.guests.values()
+        ]
+
+    def network(self, node):
+        n = self.nodes.index(node)
+        return [
+            {"iface": "vmbr0", "type": "bridge", "cidr": f"10.{n % 256}.255.1/16"},
+            {"iface": "vmbr0.100", "type": "vlan", "cidr": f"172.16.{n % 256}.10/24"},
+            {"iface": "eno1", "type": "eth"},
+        ]
+
+    def guests_on(self, node, vm_type):
+        return [
+            {"vmid": g["vmid"], "name": g["name"], "status": g["status"], "cpus": g["maxcpu"], "maxmem": g["maxmem"], "maxdisk": g["maxdisk"]}
+            for g in self.guests.values()
+            if g["node"] == node and g["type"] == vm_type
+        ]
+
+    def guest(self, node, vmid, vm_type=None):
+        g = self.guests.get(int(vmid))
+        if g is None or g["node"] != node or (vm_type and g["type"] != vm_type):
+            raise KeyError(vmid)
+        return g
+
+    def config(self, node, vm_type, vmid):
+        g = self.guest(node, vmid, vm_type)
+        config = {"name": g["name"], "cores": g["maxcpu"], "memory": g["maxmem"] // 1024 ** 2, "digest": f"{g['vmid']:040x}"}
+        if vm_type == "qemu":
+            config["agent"] = "1" if g["agent"] else "0"
+            config["net0"] = f"virtio={self._mac(g['vmid'], 0)},bridge=vmbr0"
+        else:
+            config["hostname"] = g["name"]
+            config["net0"] = f"name=eth0,bridge=vmbr0,hwaddr={self._mac(g['vmid'], 0)},ip=dhcp"
+        return config
+
+    def agent(self, node, vmid):
+        g = self.guest(node, vmid, "qemu")
+        if not g["agent"] or g["status"] != "running":
+            raise PermissionError("QEMU guest agent is not running")
+        return {"result": [
+            {"name": "lo", "hardware-address": "00:00:00:00:00:00", "ip-addresses": [{"ip-address-type": "ipv4", "ip-address": "127.0.0.1", "prefix": 8}]},
+            {
+                "name": "eth0",
+                "hardware-address": self._mac(g["vmid"], 0).lower(),
+                "ip-addresses": [{"ip-address-type": "ipv4", "ip-address": ip, "prefix": 16} for ip in g["ips"]],
+            },
+        ]}
+
+    def lxc_interfaces(self, node, vmid):
+        g = self.guest(node, vmid, "lxc")
+        return [{"name": "lo", "inet": "127.0.0.1/8"}] + [
+            {"name": f"eth{i}", "hwaddr": self._mac(g["vmid"], i).lower(), "inet": f"{ip}/16"} for i, ip in enumerate(g["ips"])
+        ]
+
+
+class MockProxmoxServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cluster, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=42):
+        super().__init__((host, port), _Handler)
+        self.cluster = cluster
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.errors_injected = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a daemon thread; returns self for chaining."""
+        threading.Thread(target=self.serve_forever, name="mock-proxmox", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def _tick(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            self.errors_injected += int(fail)
+        return delay, fail
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.startswith("/api2/json"):
+            path = path[len("/api2/json"):]
+        for pattern, route in _ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            return self._send(501, {"data": None, "message": f"Method 'GET {path}' not implemented"})
+
+        delay, fail = self.server._tick(route)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self._send(503, {"data": None, "message": "injected failure"})
+
+        cluster = self.server.cluster
+        args = match.groupdict()
+        try:
+            if route == "nodes":
+                data = cluster.nodes_list()
+            elif route == "cluster_resources":
+                data = cluster.cluster_resources()
+            elif route == "cluster_tasks":
+                data = list(cluster.tasks)
+            elif route == "node_tasks":
+                data = [t for t in cluster.tasks if t["node"] == args["node"]]
+            elif route == "network":
+                data = cluster.network(args["node"])
+            elif route == "guests":
+                data = cluster.guests_on(args["node"], args["vm_type"])
+            elif route == "config":
+                data = cluster.config(args["node"], args["vm_type"], args["vmid"])
+            elif route == "agent":
+                data = cluster.agent(args["node"], args["vmid"])
+            else:
+                data = cluster.lxc_interfaces(args["node"], args["vmid"])
+        except (KeyError, ValueError):
+            return self._send(500, {"data": None, "message": "Configuration file does not exist"})
+        except PermissionError as e:
+            return self._send(500, {"data": None, "message": str(e)})
+        self._send(200, {"data": data})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def add_cluster_args(parser):
+    parser.add_argument("--nodes", type=int, default=3, help="Proxmox nodes (N)")
+    parser.add_argument("--vms", type=int, default=100, help="Guests per node (M)")
+    parser.add_argument("--ips", type=int, default=2, help="IPs per guest (K)")
+    parser.add_argument("--lxc-ratio", type=float, default=0.3)
+    parser.add_argument("--agent-ratio", type=float, default=0.8, help="Share of qemu guests with a working agent")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def server_from_args(args, port=0):
+    cluster = MockCluster(args.nodes, args.vms, args.ips, lxc_ratio=args.lxc_ratio, agent_ratio=args.agent_ratio, seed=args.seed)
+    return MockProxmoxServer(cluster, port=port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_args(parser)
+    parser.add_argument("--port", type=int, default=8006)
+    args = parser.parse_args()
+    server = server_from_args(args, port=args.port)
+    print(f"Mock Proxmox API with {len(server.cluster.guests)} guests on {server.base_url}/api2/json")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
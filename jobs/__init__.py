@@ -1,6 +1,6 @@
 from .discovery import DiscoverPhysicalCables
-from .proxmox_sync import SyncProxmoxInventory
+from .proxmox_sync import SyncProxmoxInventory, SyncProxmoxNode, SyncProxmoxShardDeadline
 from nautobot.apps.jobs import register_jobs
 
 name = "Network Discovery Jobs"
-register_jobs(DiscoverPhysicalCables, SyncProxmoxInventory)
+register_jobs(DiscoverPhysicalCables, SyncProxmoxInventory, SyncProxmoxNode, SyncProxmoxShardDeadline)
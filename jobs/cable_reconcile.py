@@ -0,0 +1,134 @@
+"""Reconciliation of discovered links against the cables already in Nautobot.
+
+Every cable on the scanned devices is loaded with one query and compared in memory
+with the observed link set; the outcome is recorded in a ChangePlan. New cables are
+saved one by one: ``Cable.save`` and its signals set the interfaces' ``cable`` and
+trace cable paths, which a ``bulk_create`` would skip. Stale and conflicting cables
+are tagged (or, when retiring, deleted) in bulk.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from nautobot.dcim.models import Cable, Interface
+from nautobot.extras.models import TaggedItem
+
+STALE_CABLE_TAG = "stale-cable"
+
+
+def cable_label(cable):
+    ends = [
+        f"{getattr(device, 'name', '?')}:{getattr(termination, 'name', termination)}"
+        for device, termination in ((cable._termination_a_device, cable.termination_a), (cable._termination_b_device, cable.termination_b))
+    ]
+    return " <-> ".join(ends)
+
+
+def link_label(side_a, side_b, source):
+    return f"{side_a.device.name}:{side_a.name} <-> {side_b.device.name}:{side_b.name} ({source})"
+
+
+class CableReconciler:
+    def __init__(self, plan, device_ids, tag):
+        self.plan = plan
+        self.tag = tag
+        self.cable_ct = ContentType.objects.get_for_model(Cable)
+        iface_ct = ContentType.objects.get_for_model(Interface)
+
+        self.by_iface = {}
+        self.cables = {}
+        for cable in Cable.objects.filter(
+            Q(_termination_a_device_id__in=device_ids) | Q(_termination_b_device_id__in=device_ids)
+        ).select_related("_termination_a_device", "_termination_b_device").prefetch_related("termination_a", "termination_b"):
+            self.cables[cable.pk] = cable
+            if cable.termination_a_type_id == iface_ct.pk:
+                self.by_iface[cable.termination_a_id] = cable
+            if cable.termination_b_type_id == iface_ct.pk:
+                self.by_iface[cable.termination_b_id] = cable
+        self.tagged = set(
+            TaggedItem.objects.filter(tag=tag, content_type=self.cable_ct, object_id__in=self.cables).values_list("object_id", flat=True)
+        )
+
+        self.creates = []
+        self.conflicts = {}
+        self.stale = {}
+        self.confirmed = set()
+
+    def diff(self, links, scope, observable):
+        """Classify ``[(interface_a, interface_b, source), ...]`` against the loaded cables.
+
+        ``scope`` holds the interface pks whose absence of a link is meaningful (switch ports
+        scanned without errors); a cable there is stale when its far end is in ``observable``
+        but wasn't seen on this port.
+        """
+        observed = set()
+        for side_a, side_b, source in links:
+            observed.add(frozenset((side_a.pk, side_b.pk)))
+            cable_a, cable_b = self.by_iface.get(side_a.pk), self.by_iface.get(side_b.pk)
+            if cable_a is not None and cable_a is cable_b:
+                self.confirmed.add(cable_a.pk)
+                self.plan.count_unchanged("dcim.cable")
+            elif cable_a is None and cable_b is None:
+                self.creates.append((side_a, side_b, source))
+            else:
+                for cable in {cable_a, cable_b} - {None}:
+                    self.conflicts[cable.pk] = (cable, (side_a, side_b, source))
+
+        for cable in self.cables.values():
+            if cable.pk in self.conflicts or cable.pk in self.confirmed:
+                continue
+            ends = (cable.termination_a_id, cable.termination_b_id)
+            if frozenset(ends) in observed:
+                continue
+            for near, far in (ends, ends[::-1]):
+                if near in scope and far in observable:
+                    self.stale[cable.pk] = cable
+                    break
+
+        for link in self.creates:
+            self.plan.record("dcim.cable", "create", link=link_label(*link))
+        for cable, link in self.conflicts.values():
+            self.plan.record("dcim.cable", "conflict", cable=cable_label(cable), observed=link_label(*link))
+        for cable in self.stale.values():
+            self.plan.record("dcim.cable", "stale", cable=cable_label(cable))
+        for pk in self.confirmed & self.tagged:
+            self.plan.record("dcim.cable", "unstale", cable=cable_label(self.cables[pk]))
+
+    def apply(self, status, retire=False):
+        """Write the diff in one transaction; returns the links whose cable could not be created.
+
+        Without ``retire`` stale and conflicting cables are only tagged and the links
+        blocked by a conflict are left alone; with it they are deleted and replaced.
+        """
+        flagged = {**{pk: c for pk, (c, _) in self.conflicts.items()}, **self.stale}
+        creates = list(self.creates)
+        failed = []
+        with transaction.atomic():
+            if retire and flagged:
+                Cable.objects.filter(pk__in=flagged).delete()
+                # Links that were only blocked by now-deleted cables can be cabled as observed
+                for link in self.blocked_links(flagged):
+                    for side in link[:2]:
+                        if side.cable_id in flagged:
+                            side.cable = None
+                    creates.append(link)
+            elif flagged:
+                TaggedItem.objects.bulk_create(
+                    [TaggedItem(tag=self.tag, content_type=self.cable_ct, object_id=pk) for pk in flagged if pk not in self.tagged],
+                    ignore_conflicts=True,
+                )
+            TaggedItem.objects.filter(tag=self.tag, content_type=self.cable_ct, object_id__in=self.confirmed).delete()
+
+            for side_a, side_b, source in creates:
+                try:
+                    with transaction.atomic():
+                        Cable(termination_a=side_a, termination_b=side_b, status=status).save()
+                except Exception as e:
+                    failed.append((side_a, side_b, source, e))
+        return failed
+
+    def blocked_links(self, retired):
+        links = {}
+        for cable, link in self.conflicts.values():
+            if cable.pk in retired:
+                links[frozenset((link[0].pk, link[1].pk))] = link
+        return list(links.values())
@@ -1,110 +1,404 @@
-from nautobot.apps.jobs import Job, register_jobs
-from nautobot.dcim.models import Device, Interface, Cable
-from nautobot.extras.models import Status
+from django.core.cache import cache
+from nautobot.apps.jobs import Job, register_jobs, BooleanVar, IntegerVar, StringVar
+from nautobot.dcim.constants import NONCONNECTABLE_IFACE_TYPES
+from nautobot.dcim.models import Device, Interface
+from nautobot.ipam.models import IPAddressToInterface
+from nautobot.extras.models import Status, Tag
 from nautobot.virtualization.models import VirtualMachine
-import subprocess
-import re
+from collections import Counter, namedtuple
+import json
+import os
+
+from .cable_reconcile import STALE_CABLE_TAG, CableReconciler, cable_label, link_label
+from .instrumentation import instrumented
+from .proxmox_reconcile import ChangePlan
+from .refcache import ref_cache
+from .snmp import ARP_OID, SNMPEngine, SNMPTarget, format_mac, reduce_arp
+from .snmp_cache import TableCache, diff_tables
+
+# The router whose ARP table maps IPs to MACs; also read by Sync Proxmox Inventory
+ARP_SOURCE = SNMPTarget("10.1.1.1", "jntinfraro1815")
+
+FDB_OID = ".1.3.6.1.2.1.17.4.3.1.2"  # dot1dTpFdbPort
+BRIDGE_PORT_OID = ".1.3.6.1.2.1.17.1.4.1.2"  # dot1dBasePortIfIndex
+IFNAME_OID = ".1.3.6.1.2.1.31.1.1.1.1"  # ifName
+LLDP_LOC_PORT_OID = ".1.0.8802.1.1.2.1.3.7.1.3"  # lldpLocPortId
+LLDP_REM_OID = ".1.0.8802.1.1.2.1.4.1.1"  # lldpRemEntry
+SWITCH_TABLES = (FDB_OID, BRIDGE_PORT_OID, IFNAME_OID, LLDP_LOC_PORT_OID, LLDP_REM_OID)
+
+# lldpRemEntry columns and lldpRemPortIdSubtype values we use
+LLDP_REM_PORT_SUBTYPE, LLDP_REM_PORT_ID, LLDP_REM_SYS_NAME = "6", "7", "9"
+LLDP_PORT_MAC = 3
+
+# links: [(interface_a, interface_b, source)]; mac_to_port: {switch host: {MAC: ifName}};
+# scope: switch interface pks reconciled this run; observable: interface pks discovery can see
+LinkGraph = namedtuple("LinkGraph", "links mac_to_port candidate_table scope observable")
 
 name = "Network Discovery Jobs"
 
 class DiscoverPhysicalCables(Job):
     class Meta:
         name = "Discover Physical Cables (SNMP)"
-        description = "Read-Only SNMP scan of pfSense and MikroTik to map physical topology."
+        description = "Read-Only SNMP scan of pfSense and every switch in Nautobot to map physical topology."
         has_sensitive_variables = False
 
-    def snmp_walk(self, host, community, oid):
-        results = {}
-        try:
-            # Note: This requires snmpwalk to be installed on the Nautobot worker
-            cmd = ["snmpwalk", "-On", "-v2c", "-c", community, host, oid]
-            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode()
-            for line in output.splitlines():
-                if " = " in line:
-                    key, val = line.split(" = ", 1)
-                    suffix = key.replace(oid, "").strip(".")
-                    results[suffix] = val.split(": ", 1)[-1].strip('" ')
-        except Exception as e:
-            self.logger.error(f"SNMP Walk failed for {host}: {e}")
-        return results
-
-    def format_mac(self, raw):
-        parts = re.split(r'[:\-\s]', raw.strip())
-        if len(parts) == 6:
-            return ":".join([f"{int(p, 16):02X}" for p in parts if p]).upper()
-        return raw.upper()
-
-    def run(self):
-        pfsense_ip = "10.1.1.1"
-        pfsense_comm = "jntinfraro1815"
-        mik_ip = "172.16.100.50"
-        mik_comm = "rohomelab"
-
-        self.logger.info("Gathering pfSense ARP Table...")
-        arp_res = self.snmp_walk(pfsense_ip, pfsense_comm, ".1.3.6.1.2.1.4.22.1.2")
-        arp = {}
-        for k, v in arp_res.items():
-            ip = ".".join(k.split(".")[-4:])
-            try: arp[ip] = self.format_mac(v)
-            except: pass
-
-        self.logger.info("Gathering MikroTik MAC Table...")
-        # Hardcoded mapping from our discovery
-        mik_mapping = {
-            "130": "SFP13",
-            "131": "SFP14",
-            "132": "SFP15",
-            "10": "TrueNAS MGMT",
-            "16": "UPLINK TO FW",
-            "17": "MGMT/UPLINK"
-        }
-        fdb = self.snmp_walk(mik_ip, mik_comm, ".1.3.6.1.2.1.17.4.3.1.2")
-        mac_to_port = {}
-        for m_oid, bport in fdb.items():
-            m_parts = m_oid.split(".")
+    switch_role = StringVar(default="switch", description="Scan devices whose role name contains this text")
+    snmp_community = StringVar(required=False, description="Switch community when the device has no snmp_community config context (else $NAUTOBOT_SNMP_COMMUNITY)")
+    max_parallel_walks = IntegerVar(default=32, min_value=1, description="SNMP walks run at the same time across all devices")
+    max_repetitions = IntegerVar(default=25, min_value=1, description="SNMP GETBULK max-repetitions (rows per request)")
+    snmp_timeout = IntegerVar(default=5, min_value=1, description="SNMP request timeout in seconds")
+    snmp_cache_ttl = IntegerVar(default=300, min_value=0, description="Reuse SNMP tables collected within this many seconds (0 = always walk)")
+    full_reconcile = BooleanVar(default=False, description="Reconcile every learned MAC, not only those that changed since the last run")
+    retire_stale = BooleanVar(default=False, description=f"Delete stale and conflicting cables instead of tagging them {STALE_CABLE_TAG}")
+
+    # Row reducers run on the SNMP worker threads: pure Python, no ORM or logging
+    def reduce_fdb(self, rows):
+        """dot1dTpFdbPort rows (index = MAC as six decimal octets) -> {MAC: bridge port}."""
+        mac_to_bport = {}
+        for index, bport in rows:
+            m_parts = index.split(".")
             if len(m_parts) == 6:
-                mac = ":".join([f"{int(x):02X}" for x in m_parts])
-                port_name = mik_mapping.get(bport)
-                if port_name: mac_to_port[mac] = port_name
-
-        # Targets to link
-        targets = [
-            ("wow-ts01", "172.16.110.100", "eno1"),
-            ("wow-ts01", "172.16.160.100", "eno2"),
-            ("wow-prox1", "172.16.110.101", "eno1"),
-            ("wow-ocp-node2", "172.16.100.102", "eno1"),
-            ("wow-ocp-node3", "172.16.100.103", "eno1"),
-            ("wow-ocp-node4", "172.16.100.104", "eno1"),
-        ]
-
-        mik_switch = Device.objects.get(name="wow-10gb-mik-sw")
-        status_connected = Status.objects.get(name="Connected")
-
-        for name, ip, if_name in targets:
-            mac = arp.get(ip)
-            port_name = mac_to_port.get(mac)
-            if not port_name: continue
-
-            self.logger.info(f"Processing: {name} on port {port_name}")
-
-            try:
-                device = Device.objects.get(name=name)
-                # Standardize port name for lookup
-                nb_port = port_name.lower().replace("sfp", "sfp-plus")
-                if "TrueNAS" in port_name or "UPLINK" in port_name: nb_port = port_name
-
-                side_a = Interface.objects.get(device=device, name=if_name)
-                side_b = Interface.objects.get(device=mik_switch, name=nb_port)
-
-                if not side_a.cable and not side_b.cable:
-                    Cable.objects.create(
-                        termination_a=side_a,
-                        termination_b=side_b,
-                        status=status_connected
-                    )
-                    self.logger.success(f"Created cable for {name} -> {port_name}")
-                else:
-                    self.logger.info(f"Cable already exists for {name}")
-
-            except Exception as e:
-                self.logger.error(f"Failed to create cable for {name}: {e}")
+                mac_to_bport[":".join([f"{int(x):02X}" for x in m_parts])] = str(bport)
+        return mac_to_bport
+
+    def reduce_names(self, rows):
+        """Single-column tables (ifName, dot1dBasePortIfIndex, lldpLocPortId) -> {index: str}; binary values are kept."""
+        return {index: value if isinstance(value, bytes) else str(value) for index, value in rows if value is not None}
+
+    def reduce_lldp(self, rows):
+        """lldpRemEntry rows (index column.timeMark.localPort.remIndex) -> {localPort: [neighbour, ...]}."""
+        entries = {}
+        for index, value in rows:
+            parts = index.split(".")
+            if len(parts) != 4 or parts[0] not in (LLDP_REM_PORT_SUBTYPE, LLDP_REM_PORT_ID, LLDP_REM_SYS_NAME):
+                continue
+            entries.setdefault((parts[2], parts[3]), {})[parts[0]] = value
+        neighbours = {}
+        for (local_port, _), cols in sorted(entries.items()):
+            subtype, port_id = cols.get(LLDP_REM_PORT_SUBTYPE), cols.get(LLDP_REM_PORT_ID)
+            if subtype == LLDP_PORT_MAC and port_id is not None:
+                port_id = format_mac(port_id)
+            elif isinstance(port_id, bytes):
+                port_id = port_id.decode(errors="replace")
+            sys_name = cols.get(LLDP_REM_SYS_NAME)
+            if isinstance(sys_name, bytes):
+                sys_name = sys_name.decode(errors="replace")
+            neighbours.setdefault(local_port, []).append({"sys_name": sys_name, "port_id": port_id, "port_subtype": subtype})
+        return neighbours
+
+    def reduce_table(self, key, rows):
+        oid = key[1]
+        if oid == ARP_OID:
+            return reduce_arp(rows)
+        if oid == FDB_OID:
+            return self.reduce_fdb(rows)
+        if oid == LLDP_REM_OID:
+            return self.reduce_lldp(rows)
+        return self.reduce_names(rows)
+
+    def run(
+        self, switch_role="switch", snmp_community="", max_parallel_walks=32, max_repetitions=25, snmp_timeout=5,
+        snmp_cache_ttl=300, full_reconcile=False, retire_stale=False,
+    ):
+        with instrumented(self):
+            self.snmp = SNMPEngine(
+                max_workers=max_parallel_walks, max_repetitions=max_repetitions, timeout=snmp_timeout, observer=self.metrics.record_call
+            )
+            self.tables = TableCache(cache, snmp_cache_ttl)
+            community = snmp_community or os.environ.get("NAUTOBOT_SNMP_COMMUNITY", "rohomelab")
+            self.discover(switch_role, community, full_reconcile, retire_stale)
+
+    def collect_tables(self, requests):
+        """Reduced tables for ``[(target, oid), ...]``, walking only those not fresh in the cache."""
+        tables, walks = {}, []
+        for target, oid in requests:
+            cached = self.tables.fresh(target.host, oid)
+            if cached is not None:
+                tables[(target.host, oid)] = cached
+            else:
+                walks.append((target, oid))
+        # Rows are reduced as they stream in; no full copy of any table is kept
+        walked, errors = self.snmp.walk_many(walks, handler=self.reduce_table)
+        for (host, oid), table in walked.items():
+            self.tables.store(host, oid, table)
+        tables.update(walked)
+        self.logger.info(f"SNMP tables: {len(walked)} walked, {len(requests) - len(walks)} from cache, {len(errors)} failed")
+        return tables, errors
+
+    def load_switches(self, switch_role, community):
+        """{Device: SNMPTarget} for every switch with a primary IP; a device's snmp_community config context wins."""
+        switches = {}
+        for device in (
+            Device.objects.filter(role__name__icontains=switch_role)
+            .select_related("primary_ip4", "primary_ip6")
+            .annotate_config_context_data()
+        ):
+            if device.primary_ip is None:
+                self.logger.warning(f"Skipping switch {device.name}: no primary IP")
+                continue
+            context = device.get_config_context()
+            switches[device] = SNMPTarget(str(device.primary_ip.host), context.get("snmp_community") or community)
+        return switches
+
+    def discover(self, switch_role="switch", community="rohomelab", full_reconcile=False, retire_stale=False):
+        pfsense = ARP_SOURCE
+
+        with self.metrics.phase("targets"):
+            switches = self.load_switches(switch_role, community)
+        if not switches:
+            self.logger.error(f"No devices with a role matching '{switch_role}' and a primary IP to scan")
+            return
+
+        self.logger.info(f"Gathering pfSense ARP Table and bridge/LLDP tables of {len(switches)} switches...")
+        with self.metrics.phase("snmp_walk"):
+            # Every table of every device in one concurrent batch: bounded by the slowest switch
+            tables, errors = self.collect_tables(
+                [(pfsense, ARP_OID)] + [(target, oid) for target in switches.values() for oid in SWITCH_TABLES]
+            )
+        for (host, oid), error in errors.items():
+            self.logger.error(f"SNMP Walk of {oid} failed for {host}: {error}")
+        arp = tables.get((pfsense.host, ARP_OID), {})
+
+        with self.metrics.phase("targets"):
+            graph = self.build_graph(switches, tables, errors, arp, full_reconcile)
+
+        with self.metrics.phase("db_write"):
+            status_connected = ref_cache.get(Status, name="Connected")
+            if status_connected is None:
+                self.logger.error("Status 'Connected' missing in Nautobot")
+                return
+            tag, _ = ref_cache.get_or_create(Tag, {"color": "ff0000"}, name=STALE_CABLE_TAG)
+
+            # Cables on every scanned device and link endpoint, diffed in memory and written in one transaction
+            plan = ChangePlan()
+            device_ids = {d.pk for d in switches} | {side.device_id for link in graph.links for side in link[:2]}
+            reconciler = CableReconciler(plan, device_ids, tag)
+            reconciler.diff(graph.links, graph.scope, graph.observable)
+            failed = reconciler.apply(status_connected, retire=retire_stale)
+
+        for side_a, side_b, source, e in failed:
+            self.logger.error(f"Failed to create cable {link_label(side_a, side_b, source)}: {e}")
+        summary = plan.summary().get("dcim.cable", {})
+        self.logger.info("Cable changes: " + (", ".join(f"{action} {count}" for action, count in sorted(summary.items())) or "none"))
+        action = "retired" if retire_stale else f"tagged {STALE_CABLE_TAG}"
+        for cable, link in reconciler.conflicts.values():
+            self.logger.warning(f"Conflicting cable {cable_label(cable)} ({action}): observed {link_label(*link)}")
+        for cable in reconciler.stale.values():
+            self.logger.warning(f"Stale cable {cable_label(cable)} ({action}): link no longer observed")
+        self.create_file(
+            "cable-reconcile.json",
+            json.dumps(plan.as_dict(retired=retire_stale, failed=len(failed), full_reconcile=full_reconcile), indent=2, default=str),
+        )
+
+        # Only a clean run becomes the baseline; otherwise the next run retries the same changes
+        if not errors and not failed:
+            for host, ports in graph.mac_to_port.items():
+                self.tables.save_snapshot(f"ports:{host}", ports)
+            self.tables.save_snapshot("candidates", graph.candidate_table)
+
+    def build_graph(self, switches, tables, errors, arp, full_reconcile=False):
+        """Resolve every observed link to a pair of Nautobot interfaces, entirely in memory.
+
+        Returns a LinkGraph.
+        """
+        # Bridge port -> ifIndex -> ifName, per switch
+        port_names, lldp = {}, {}
+        for device, target in switches.items():
+            if_names = tables.get((target.host, IFNAME_OID), {})
+            bridge_ports = tables.get((target.host, BRIDGE_PORT_OID), {})
+            port_names[device] = {bport: if_names[ifindex] for bport, ifindex in bridge_ports.items() if ifindex in if_names}
+            loc_ports = tables.get((target.host, LLDP_LOC_PORT_OID), {})
+            for local_port, neighbours in tables.get((target.host, LLDP_REM_OID), {}).items():
+                # lldpLocPortId is usually the interface name; some devices report a MAC there instead
+                local_name = loc_ports.get(local_port)
+                if not isinstance(local_name, str) or not local_name:
+                    local_name = if_names.get(local_port)
+                if local_name:
+                    lldp[(device, local_name)] = neighbours
+
+        candidates = self.load_candidates(arp, exclude_device_ids={d.pk for d in switches})
+        self.logger.info(f"{len(candidates)} candidate host interfaces with a known MAC")
+        candidate_table = {mac: str(iface.pk) for mac, iface in candidates.items()}
+
+        # LLDP neighbours by system name (FQDN or short name)
+        sys_names = {n["sys_name"] for ns in lldp.values() for n in ns if n["sys_name"]}
+        lookup = sys_names | {s.split(".")[0] for s in sys_names}
+        devices_by_name = {d.name.lower(): d for d in Device.objects.filter(name__in=lookup)} if lookup else {}
+        for device in switches:
+            devices_by_name.setdefault(device.name.lower(), device)
+
+        # Every interface on the switches and their LLDP neighbours, in one query
+        device_ids = {d.pk for d in switches} | {d.pk for d in devices_by_name.values()}
+        ifaces = {}
+        for iface in (
+            Interface.objects.filter(device_id__in=device_ids)
+            .exclude(type__in=NONCONNECTABLE_IFACE_TYPES)
+            .select_related("device", "cable")
+        ):
+            for variant in self.name_variants(iface.name):
+                ifaces.setdefault((iface.device_id, variant), iface)
+
+        def resolve(device, port_name):
+            for variant in self.name_variants(port_name):
+                iface = ifaces.get((device.pk, variant))
+                if iface is not None:
+                    return iface
+            return None
+
+        links, seen = [], set()
+
+        def add_link(side_a, side_b, source):
+            key = frozenset((side_a.pk, side_b.pk))
+            if side_a.pk != side_b.pk and key not in seen:
+                seen.add(key)
+                links.append((side_a, side_b, source))
+
+        # LLDP: switch port <-> neighbour port, found from either end
+        uplinks = set()
+        for (device, local_name), neighbours in lldp.items():
+            uplinks.add((device.pk, local_name.lower()))
+            if len(neighbours) > 1:
+                self.logger.info(f"Skipping {device.name}:{local_name}: {len(neighbours)} LLDP neighbours (shared segment)")
+                continue
+            neighbour = neighbours[0]
+            local = resolve(device, local_name)
+            if neighbour["port_subtype"] == LLDP_PORT_MAC:
+                remote = candidates.get(neighbour["port_id"])
+            else:
+                sys_name = (neighbour["sys_name"] or "").lower()
+                remote_device = devices_by_name.get(sys_name) or devices_by_name.get(sys_name.split(".")[0])
+                remote = resolve(remote_device, neighbour["port_id"]) if remote_device and neighbour["port_id"] else None
+            if local is None or remote is None:
+                self.logger.warning(
+                    f"LLDP neighbour {neighbour['sys_name']}:{neighbour['port_id']} on {device.name}:{local_name} not found in Nautobot"
+                )
+                continue
+            add_link(local, remote, "lldp")
+
+        # FDB: a host MAC is learned along the whole path; it is attached where the fewest MACs are learned
+        mac_to_port, locations, port_load = {}, {}, Counter()
+        for device, target in switches.items():
+            if (target.host, FDB_OID) not in tables:
+                continue
+            ports = mac_to_port[target.host] = {}
+            for mac, bport in tables[(target.host, FDB_OID)].items():
+                port_name = port_names[device].get(bport)
+                if port_name is None or (device.pk, port_name.lower()) in uplinks:
+                    continue
+                ports[mac] = port_name
+                port_load[(device, port_name)] += 1
+                if mac in candidates:
+                    locations.setdefault(mac, []).append((device, port_name))
+
+        dirty_ports = None if full_reconcile or errors else self.changed_ports(switches, mac_to_port, candidate_table, candidates)
+
+        by_port = {}
+        for mac, places in locations.items():
+            places.sort(key=lambda p: port_load[p])
+            if len(places) > 1 and port_load[places[0]] == port_load[places[1]]:
+                self.logger.info(f"Skipping {candidates[mac].device.name} ({mac}): learned on several edge ports")
+                continue
+            device, port_name = places[0]
+            if dirty_ports is not None and (device.pk, port_name) not in dirty_ports:
+                continue
+            iface = candidates[mac]
+            by_port.setdefault((device, port_name), {})[iface.device_id] = iface
+        for (device, port_name), hosts in by_port.items():
+            if len(hosts) > 1:
+                # Several hosts behind one port: an uplink or unmanaged switch, not a direct cable
+                names = ", ".join(sorted(i.device.name for i in hosts.values()))
+                self.logger.info(f"Skipping port {device.name}:{port_name}: MACs of several devices learned ({names})")
+                continue
+            switch_iface = resolve(device, port_name)
+            if switch_iface is None:
+                self.logger.error(f"Interface {port_name} not found on {device.name}")
+                continue
+            add_link(next(iter(hosts.values())), switch_iface, "fdb")
+
+        # Stale cables are only judged on ports this run actually looked at
+        failed_hosts = {host for host, _ in errors}
+        scope = set()
+        for device, target in switches.items():
+            if target.host in failed_hosts or target.host not in mac_to_port:
+                continue
+            if dirty_ports is None:
+                scope.update(i.pk for i in ifaces.values() if i.device_id == device.pk)
+                continue
+            for port_name in [p for pk, p in dirty_ports if pk == device.pk] + [n for d, n in lldp if d == device]:
+                iface = resolve(device, port_name)
+                if iface is not None:
+                    scope.add(iface.pk)
+        switch_ids = {d.pk for d in switches}
+        observable = {i.pk for i in candidates.values()} | {i.pk for i in ifaces.values() if i.device_id in switch_ids}
+
+        self.logger.info(f"Link graph: {len(links)} links across {len(switches)} switches")
+        return LinkGraph(links, mac_to_port, candidate_table, scope, observable)
+
+    def name_variants(self, port_name):
+        """Case-insensitive lookup keys for an interface name, plus MikroTik's sfp-sfpplusN for sfp-plusN."""
+        lowered = port_name.lower()
+        variants = [lowered]
+        if lowered.startswith("sfp-sfpplus"):
+            variants.append(lowered.replace("sfp-sfpplus", "sfp-plus", 1))
+        return variants
+
+    def changed_ports(self, switches, mac_to_port, candidate_table, candidates):
+        """``(switch pk, port)`` pairs affected by MACs that appeared, vanished or moved since the last clean run.
+
+        Returns None (reconcile everything) when there is no baseline yet.
+        """
+        prev_candidates = self.tables.snapshot("candidates")
+        if prev_candidates is None:
+            self.logger.info("No previous discovery snapshot; reconciling every port")
+            return None
+        # A MAC newly matched to (or dropped from) a Nautobot interface counts as changed everywhere
+        candidate_macs = set().union(*diff_tables(prev_candidates, candidate_table))
+
+        ports = set()
+        totals = Counter()
+        for device, target in switches.items():
+            current = mac_to_port.get(target.host, {})
+            prev_ports = self.tables.snapshot(f"ports:{target.host}")
+            if prev_ports is None:
+                # Switch scanned for the first time
+                ports.update((device.pk, port) for port in current.values())
+                continue
+            added, removed, moved = diff_tables(prev_ports, current)
+            totals.update(added=len(added), removed=len(removed), moved=len(moved))
+            for mac in sorted(removed):
+                if mac in candidates:
+                    self.logger.info(f"{candidates[mac].device.name} ({mac}) no longer learned on {device.name}:{prev_ports[mac]}")
+            # Both the old and the new port of a moved MAC need another look
+            for mac in added | removed | moved | candidate_macs:
+                for table in (current, prev_ports):
+                    if mac in table:
+                        ports.add((device.pk, table[mac]))
+        self.logger.info(
+            f"Since last run: {totals['added']} MACs appeared, {totals['removed']} vanished, {totals['moved']} moved; {len(ports)} ports to reconcile"
+        )
+        return ports
+
+    def load_candidates(self, arp, exclude_device_ids=()):
+        """MAC -> physical Interface for every interface with a MAC address or an IP found in ``arp``.
+
+        Two select_related queries, independent of the number of hosts.
+        """
+        candidates = {}
+        for iface in (
+            Interface.objects.filter(mac_address__isnull=False)
+            .exclude(type__in=NONCONNECTABLE_IFACE_TYPES)
+            .exclude(device_id__in=exclude_device_ids)
+            .select_related("device", "cable")
+        ):
+            candidates.setdefault(format_mac(str(iface.mac_address)), iface)
+
+        for assignment in (
+            IPAddressToInterface.objects.filter(interface__isnull=False)
+            .exclude(interface__type__in=NONCONNECTABLE_IFACE_TYPES)
+            .exclude(interface__device_id__in=exclude_device_ids)
+            .select_related("ip_address", "interface__device", "interface__cable")
+        ):
+            mac = arp.get(str(assignment.ip_address.host))
+            if mac:
+                candidates.setdefault(mac, assignment.interface)
+        return candidates
@@ -0,0 +1,165 @@
+"""Per-run performance counters shared by the jobs in this package.
+
+A job wraps its ``run`` in :func:`instrumented`, times its phases with
+``self.metrics.phase(name)`` and reports external calls (HTTP, SNMP) through
+``record_call``. SQL queries issued from the job thread are counted via Django's
+``connection.execute_wrapper`` and attributed to the phase that was open at the time.
+
+At the end a summary table is written to the job log. When ``METRICS_ENABLED`` is set,
+every observation is also fed to Prometheus histograms in the worker's default
+registry, which Nautobot exposes when ``CELERY_WORKER_PROMETHEUS_PORTS`` is configured.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_HISTOGRAMS = None
+_HISTOGRAMS_LOCK = threading.Lock()
+
+_HISTOGRAM_SPECS = {
+    "phase": ("nautobot_job_phase_duration_seconds", "Time spent per job phase", ["job", "phase"]),
+    "call": ("nautobot_job_external_call_duration_seconds", "External API/SNMP call latency", ["job", "kind", "endpoint"]),
+    "sql": ("nautobot_job_sql_query_duration_seconds", "SQL query latency per job phase", ["job", "phase"]),
+}
+
+
+def _histogram(name, documentation, labelnames):
+    """Return the registered histogram ``name``, creating it only if no earlier import of this module did."""
+    from prometheus_client import REGISTRY, Histogram
+
+    # Nautobot re-imports the jobs package before each run, so a module global can't remember
+    # what was registered; the process-wide default registry can
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    try:
+        return Histogram(name, documentation, labelnames)
+    except ValueError:
+        # Registered by a concurrent import in between
+        return REGISTRY._names_to_collectors[name]
+
+
+def _histograms():
+    """The job histograms of this process; None when prometheus_client is unavailable."""
+    global _HISTOGRAMS
+    with _HISTOGRAMS_LOCK:
+        if _HISTOGRAMS is None:
+            try:
+                _HISTOGRAMS = {key: _histogram(*spec) for key, spec in _HISTOGRAM_SPECS.items()}
+            except ImportError:
+                _HISTOGRAMS = {}
+        return _HISTOGRAMS or None
+
+
+class _Stat:
+    __slots__ = ("count", "errors", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed, failed=False):
+        self.count += 1
+        self.errors += int(failed)
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+class Instrumentation:
+    def __init__(self, job_name):
+        self.job_name = job_name
+        self.phases = {}
+        self.calls = {}
+        self.sql = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._histograms = _histograms() if getattr(settings, "METRICS_ENABLED", False) else None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block; nested and concurrent (per-thread) phases are each counted."""
+        stack = self._stack()
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self._add(self.phases, name, time.perf_counter() - start, histogram="phase", labels=(name,))
+
+    def record_call(self, kind, endpoint, elapsed, failed=False):
+        """Record one external call, e.g. ``("http", "/nodes/{node}/qemu", 0.12)``; safe from any thread."""
+        self._add(self.calls, (kind, endpoint), elapsed, failed, histogram="call", labels=(kind, endpoint))
+
+    @contextmanager
+    def capture_sql(self, using=DEFAULT_DB_ALIAS):
+        """Count queries run on this thread's connection while the block is open."""
+        with connections[using].execute_wrapper(self._sql_wrapper):
+            yield
+
+    def _sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return execute(sql, params, many, context)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            stack = self._stack()
+            phase = stack[-1] if stack else "other"
+            self._add(self.sql, phase, time.perf_counter() - start, failed, histogram="sql", labels=(phase,))
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, table, key, elapsed, failed=False, histogram=None, labels=()):
+        with self._lock:
+            stat = table.get(key)
+            if stat is None:
+                stat = table[key] = _Stat()
+            stat.add(elapsed, failed)
+        if self._histograms:
+            self._histograms[histogram].labels(self.job_name, *labels).observe(elapsed)
+
+    def summary_rows(self):
+        """``[(section, name, count, errors, total_s, avg_s, max_s), ...]``, slowest first per section."""
+        with self._lock:
+            sections = [
+                ("phase", dict(self.phases)),
+                *(
+                    (kind, {endpoint: s for (k, endpoint), s in self.calls.items() if k == kind})
+                    for kind in sorted({k for k, _ in self.calls})
+                ),
+                ("sql", dict(self.sql)),
+            ]
+            rows = []
+            for section, stats in sections:
+                for name, s in sorted(stats.items(), key=lambda item: item[1].total, reverse=True):
+                    rows.append((section, name, s.count, s.errors, s.total, s.total / s.count, s.max))
+        return rows
+
+    def summary_table(self):
+        lines = ["| section | name | count | errors | total ms | avg ms | max ms |", "|---|---|---:|---:|---:|---:|---:|"]
+        for section, name, count, errors, total, avg, mx in self.summary_rows():
+            lines.append(f"| {section} | {name} | {count} | {errors} | {total * 1000:.0f} | {avg * 1000:.1f} | {mx * 1000:.0f} |")
+        return "\n".join(lines)
+
+
+@contextmanager
+def instrumented(job, name=None):
+    """Attach an Instrumentation to ``job.metrics`` for the duration of the block and log its summary."""
+    metrics = job.metrics = Instrumentation(name or type(job).__name__)
+    try:
+        with metrics.capture_sql(), metrics.phase("total"):
+            yield metrics
+    finally:
+        job.logger.info(f"Performance summary:\n\n{metrics.summary_table()}")
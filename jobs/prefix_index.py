@@ -0,0 +1,55 @@
+"""In-memory longest-prefix-match index over Nautobot Prefix rows.
+
+Built once per job run so "does this IP have a parent Prefix?" is answered without a
+database round trip. Prefixes are bucketed per (IP version, prefix length) in hash
+tables keyed by the integer network address; a lookup masks the address once per
+distinct prefix length, longest first, so its cost is bounded by the number of distinct
+lengths (<= 33 for IPv4) regardless of how many prefixes are loaded.
+"""
+import ipaddress
+
+
+class PrefixIndex:
+    def __init__(self, prefixes=()):
+        # version -> {prefix_length: {network_int: prefix}}
+        self._tables = {4: {}, 6: {}}
+        self._lengths = {4: [], 6: []}
+        self._size = 0
+        for prefix in prefixes:
+            self.add(prefix)
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls(queryset.iterator())
+
+    def add(self, prefix):
+        """Index anything with ``network`` and ``prefix_length`` attributes (e.g. a Prefix)."""
+        net = ipaddress.ip_network(f"{prefix.network}/{prefix.prefix_length}", strict=False)
+        table = self._tables[net.version].setdefault(net.prefixlen, {})
+        if not table:
+            self._lengths[net.version] = sorted(self._tables[net.version], reverse=True)
+        if int(net.network_address) not in table:
+            self._size += 1
+        table[int(net.network_address)] = prefix
+
+    def lookup(self, ip):
+        """Return the most specific indexed prefix containing ``ip``, or None."""
+        try:
+            addr = ipaddress.ip_address(str(ip).split("/", 1)[0])
+        except ValueError:
+            return None
+        value = int(addr)
+        bits = addr.max_prefixlen
+        tables = self._tables[addr.version]
+        for length in self._lengths[addr.version]:
+            mask = ((1 << length) - 1) << (bits - length)
+            prefix = tables[length].get(value & mask)
+            if prefix is not None:
+                return prefix
+        return None
+
+    def __contains__(self, ip):
+        return self.lookup(ip) is not None
+
+    def __len__(self):
+        return self._size
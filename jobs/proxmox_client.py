@@ -0,0 +1,253 @@
+"""Pooled, retrying HTTP client for the Proxmox VE API.
+
+One instance is shared by every worker of a sync run: connections to pveproxy are kept
+alive, the API token header is set once on the session, and transient failures are
+retried with jittered exponential backoff.
+
+Calls under ``/nodes/{node}`` also go through a per-node circuit breaker and feed an
+AIMD concurrency limit, so an unreachable or overloaded node fails fast instead of
+holding every worker for a full timeout. The limit is enforced by whoever schedules the
+calls (``FetchPipeline``), never by blocking the calling thread. Guest-agent calls are
+exempt from both: an agent that hangs until the timeout says nothing about its node.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# pveproxy answers 500 for logical errors (e.g. "QEMU guest agent is not running"),
+# so only gateway/overload responses are worth retrying.
+RETRY_STATUSES = {429, 502, 503, 504}
+
+_NODE_RE = re.compile(r"/nodes/[^/]+")
+_NODE_NAME_RE = re.compile(r"^/nodes/([^/?]+)")
+_VMID_RE = re.compile(r"/(qemu|lxc)/\d+")
+_AGENT_RE = re.compile(r"^/nodes/[^/]+/qemu/\d+/agent/")
+
+
+def endpoint_key(path):
+    """Collapse node names and VMIDs so latency is aggregated per endpoint, not per object."""
+    path = path.split("?", 1)[0]
+    return _VMID_RE.sub(r"/\1/{vmid}", _NODE_RE.sub("/nodes/{node}", path))
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without contacting the node while its circuit breaker is open."""
+
+
+class NodeBreaker:
+    """Closed -> open after ``threshold`` consecutive failures; one probe call after ``cooldown``."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self, probe=True):
+        """Return ``(allowed, transition)``; callers hold the client lock.
+
+        Calls whose outcome isn't reported back (``probe=False``) only pass a closed breaker.
+        """
+        if self.state == "closed":
+            return True, None
+        if not probe:
+            return False, None
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half-open"
+            self.probing = True
+            return True, "half-open: probing"
+        if self.state == "half-open" and not self.probing:
+            self.probing = True
+            return True, None
+        return False, None
+
+    def success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != "closed":
+            self.state = "closed"
+            return "closed: node answering again"
+        return None
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half-open" or (self.state == "closed" and self.failures >= self.threshold):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            return f"open after {self.failures} consecutive failures; failing fast for {self.cooldown:.0f}s"
+        return None
+
+
+class AdaptiveLimit:
+    """AIMD target for concurrent calls to one node; the scheduler reads ``limit``.
+
+    The limit grows by one after a full window of fast successes and is halved (at most
+    once per second) on a failure or a call slower than ``slow_call`` seconds.
+    """
+
+    def __init__(self, maximum, slow_call):
+        self.maximum = max(1, maximum)
+        self.limit = self.maximum
+        self.slow_call = slow_call
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def feedback(self, elapsed, ok):
+        """Adjust the limit; returns ``(old, new)`` when it was decreased, else None."""
+        with self._lock:
+            now = time.monotonic()
+            if not ok or elapsed > self.slow_call:
+                self._successes = 0
+                if self.limit > 1 and now - self._last_decrease >= 1.0:
+                    old, self.limit = self.limit, max(1, self.limit // 2)
+                    self._last_decrease = now
+                    return old, self.limit
+                return None
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+            return None
+
+
+class ProxmoxClient:
+    def __init__(self, base_url, user, token, verify_tls=False, timeout=10, retries=3, backoff=0.5, backoff_max=8.0, pool_size=16, observer=None,
+                 node_concurrency=None, breaker_threshold=5, breaker_cooldown=30.0, slow_call=2.0):
+        self.base_url = f"{base_url.rstrip('/')}/api2/json"
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"PVEAPIToken={user}={token}"
+        self.session.verify = verify_tls
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        # Optional callback(kind, endpoint, elapsed, failed), e.g. Instrumentation.record_call
+        self.observer = observer
+
+        self.node_concurrency = node_concurrency
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.slow_call = slow_call
+        self._breakers = {}
+        self._limits = {}
+        # (node, message) for breaker transitions and concurrency cuts; drained by the job thread
+        self.events = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get(self, path, params=None, retries=None, timeout=None):
+        """GET ``path`` (relative to /api2/json) and return the ``data`` member of the response."""
+        endpoint = endpoint_key(path)
+        match = _NODE_NAME_RE.match(path)
+        node = match.group(1) if match else None
+        # Agent calls are relayed to the guest: their timeouts and latency don't reflect node health
+        health = node if node is not None and not _AGENT_RE.match(path) else None
+        attempts = 1 + (self.retries if retries is None else retries)
+        for attempt in range(attempts):
+            last_try = attempt == attempts - 1
+            self._check_breaker(node, probe=health is not None)
+            error = resp = None
+            start = time.monotonic()
+            try:
+                resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            elapsed = time.monotonic() - start
+            if error is not None:
+                self._record(endpoint, elapsed, failed=True)
+                self._node_outcome(health, elapsed, ok=False)
+                if last_try:
+                    raise error
+            else:
+                self._record(endpoint, elapsed, failed=resp.status_code >= 400)
+                # 500s are logical errors from a healthy pveproxy; only overload/gateway answers count against the node
+                self._node_outcome(health, elapsed, ok=resp.status_code not in RETRY_STATUSES)
+                if resp.status_code not in RETRY_STATUSES or last_try:
+                    resp.raise_for_status()
+                    return resp.json().get("data")
+            self._sleep(attempt)
+
+    def drain_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def open_circuits(self):
+        with self._lock:
+            return sorted(node for node, breaker in self._breakers.items() if breaker.state != "closed")
+
+    def node_limit(self, node):
+        """Current AIMD concurrency limit for ``node`` (None when unlimited), for the task scheduler."""
+        if not self.node_concurrency:
+            return None
+        with self._lock:
+            return self._adaptive_limit(node).limit
+
+    def _check_breaker(self, node, probe=True):
+        if node is None:
+            return
+        with self._lock:
+            breaker = self._breakers.get(node)
+            if breaker is None:
+                return
+            allowed, transition = breaker.allow(probe)
+        if transition:
+            self.events.append((node, f"circuit {transition}"))
+        if not allowed:
+            raise CircuitOpenError(f"circuit open for node {node}")
+
+    def _adaptive_limit(self, node):
+        # Callers hold the client lock
+        limit = self._limits.get(node)
+        if limit is None:
+            limit = self._limits[node] = AdaptiveLimit(self.node_concurrency, self.slow_call)
+        return limit
+
+    def _node_outcome(self, node, elapsed, ok):
+        if node is None:
+            return
+        with self._lock:
+            breaker = self._breakers.setdefault(node, NodeBreaker(self.breaker_threshold, self.breaker_cooldown))
+            transition = breaker.success() if ok else breaker.failure()
+            limit = self._adaptive_limit(node) if self.node_concurrency else None
+        if transition:
+            self.events.append((node, f"circuit {transition}"))
+        if limit is not None:
+            cut = limit.feedback(elapsed, ok)
+            if cut:
+                reason = "failure" if not ok else f"{elapsed:.1f}s call"
+                self.events.append((node, f"concurrency {cut[0]} -> {cut[1]} after {reason}"))
+
+    def _sleep(self, attempt):
+        # Full jitter keeps concurrent workers from retrying in lockstep against a struggling node
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt))))
+
+    def _record(self, endpoint, elapsed, failed=False):
+        if self.observer is not None:
+            self.observer("http", endpoint, elapsed, failed)
@@ -0,0 +1,65 @@
+"""Parsing of Proxmox guest config payloads (``/nodes/{node}/{qemu|lxc}/{vmid}/config``).
+
+Pure functions with no Nautobot dependency, shared by the sync job (agent detection,
+NIC MACs for ARP lookups) and the reconciler (the detail pass).
+"""
+import re
+
+MAC_RE = re.compile(r"[0-9A-Fa-f]{2}(:[0-9A-Fa-f]{2}){5}")
+DISK_KEY_RE = re.compile(r"(ide|sata|scsi|virtio|efidisk|tpmstate|rootfs|mp)\d*")
+NIC_KEY_RE = re.compile(r"net\d+")
+
+
+def config_options(value):
+    """Split a Proxmox property string such as "virtio=BC:24:11:00:00:01,bridge=vmbr0,tag=20" into a dict."""
+    return dict(part.partition("=")[::2] for part in str(value).split(",") if part)
+
+
+def guest_details(config, vm_type):
+    """Disks, NICs and CPU type from a ``/nodes/{node}/{qemu|lxc}/{vmid}/config`` payload."""
+    disks, nics = [], []
+    for key, value in sorted(config.items()):
+        if DISK_KEY_RE.fullmatch(key):
+            volume, _, rest = str(value).partition(",")
+            options = config_options(rest)
+            if options.get("media") != "cdrom":
+                disks.append({"slot": key, "volume": volume, "size": options.get("size")})
+        elif NIC_KEY_RE.fullmatch(key):
+            options = config_options(value)
+            if vm_type == "lxc":
+                model, mac, nic_name = options.get("type", "veth"), options.get("hwaddr"), options.get("name") or key
+            elif "macaddr" in options:
+                model, mac, nic_name = options.get("model"), options["macaddr"], key
+            else:
+                # Short form: the MAC is the value of the model option (virtio=, e1000=, ...)
+                model, mac = next(((k, v) for k, v in options.items() if MAC_RE.fullmatch(v)), (None, None))
+                nic_name = key
+            tag = options.get("tag", "")
+            nics.append({
+                "slot": key,
+                "name": nic_name,
+                "model": model,
+                "mac": mac.upper() if mac else None,
+                "bridge": options.get("bridge"),
+                "vlan": int(tag) if tag.isdigit() else None,
+                "trunks": options.get("trunks"),
+            })
+    if vm_type == "lxc":
+        cpu = config.get("arch")
+    else:
+        # "host", or "cputype=host,flags=+aes"; absent means Proxmox's default model
+        cpu = config_options(config["cpu"]).get("cputype", config["cpu"].split(",")[0]) if config.get("cpu") else "default"
+    return {"cpu": cpu, "cores": config.get("cores"), "sockets": config.get("sockets"), "disks": disks, "nics": nics}
+
+
+def agent_enabled(value):
+    """Interpret a qemu config ``agent`` option such as "1" or "enabled=1,fstrim_cloned_disks=1"."""
+    if not value:
+        return False
+    for part in str(value).split(","):
+        key, _, val = part.partition("=")
+        if not val:
+            return key.strip() == "1"
+        if key.strip() == "enabled":
+            return val.strip() == "1"
+    return False
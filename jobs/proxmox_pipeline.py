@@ -0,0 +1,172 @@
+"""Concurrent fetch stage for the Proxmox sync job.
+
+Worker threads only talk to the Proxmox API. Whatever they produce is pushed onto a
+bounded queue which the job drains from its own thread, so ORM writes and job logging
+never leave the thread that owns the database connection.
+"""
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class FetchPipeline:
+    """Bounded worker pool feeding a single consumer through a queue.
+
+    Tasks are submitted per Proxmox node and may submit follow-up tasks (e.g. a VM
+    listing fanning out into guest-agent calls). At most ``node_concurrency`` tasks
+    run against the same node at once, fewer while ``node_limit(node_name)`` (e.g.
+    ``ProxmoxClient.node_limit``, the node's AIMD limit) is lower; ``max_workers`` caps
+    the pool overall. Tasks over a node's cap wait in that node's queue, not on a worker
+    thread, so a busy or throttled node never holds pool threads that other nodes' tasks
+    could use.
+    """
+
+    def __init__(self, max_workers=8, node_concurrency=4, maxsize=256, node_limit=None):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="proxmox-fetch")
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._node_concurrency = max(1, node_concurrency)
+        self._node_limit = node_limit
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._cancelled = threading.Event()
+        # Held until messages() starts so the pipeline can't finish while still being seeded
+        self._pending = 1
+
+    def submit(self, node_name, func, *args):
+        """Schedule ``func(*args)`` against ``node_name``. Exceptions are emitted as ``error`` messages."""
+        with self._lock:
+            self._pending += 1
+            if self._running[node_name] >= self._cap(node_name):
+                self._waiting[node_name].append((func, args))
+                return
+            self._running[node_name] += 1
+        self._executor.submit(self._run, node_name, func, args)
+
+    def emit(self, kind, node_name, payload):
+        """Hand a result to the consumer. Blocks while the queue is full (backpressure)."""
+        self._put((kind, node_name, payload))
+
+    def messages(self):
+        """Yield ``(kind, node_name, payload)`` until all submitted work has finished."""
+        self._finish_one()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop scheduling work and release any worker blocked on a full queue."""
+        self._cancelled.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._executor.shutdown(wait=True)
+
+    def _run(self, node_name, func, args):
+        try:
+            if not self._cancelled.is_set():
+                func(*args)
+        except Exception as e:
+            self.emit("error", node_name, f"{getattr(func, '__name__', 'task')} failed for {node_name}: {e}")
+        finally:
+            self._release(node_name)
+            self._finish_one()
+
+    def _cap(self, node_name):
+        limit = self._node_limit(node_name) if self._node_limit is not None else None
+        return max(1, min(self._node_concurrency, limit or self._node_concurrency))
+
+    def _release(self, node_name):
+        """Start as many of the node's waiting tasks as its cap now allows (it may have moved)."""
+        ready = []
+        with self._lock:
+            self._running[node_name] -= 1
+            waiting = self._waiting[node_name]
+            if self._cancelled.is_set():
+                # After close() nobody waits on the pending count, so queued tasks are dropped
+                waiting.clear()
+                return
+            while waiting and self._running[node_name] < self._cap(node_name):
+                self._running[node_name] += 1
+                ready.append(waiting.popleft())
+        for func, args in ready:
+            self._executor.submit(self._run, node_name, func, args)
+
+    def _finish_one(self):
+        with self._lock:
+            self._pending -= 1
+            done = self._pending == 0
+        if done:
+            self._put(_DONE)
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+
+class NegativeCache:
+    """TTL'd set of keys (e.g. VMIDs whose guest agent just failed) shared by the fetch workers.
+
+    Entries are loaded from and saved back to a Django cache backend by the job thread,
+    so they survive across runs; workers only touch the in-memory copy. ``save`` re-reads
+    and merges, so one run never drops entries another run stored meanwhile.
+    """
+
+    def __init__(self, backend, key, ttl):
+        self.backend = backend
+        self.key = key
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self._lock = threading.Lock()
+        now = time.time()
+        stored = (backend.get(key) or {}) if ttl > 0 else {}
+        self._entries = {k: expires for k, expires in stored.items() if expires > now}
+
+    def __contains__(self, item):
+        with self._lock:
+            hit = self._entries.get(str(item), 0) > time.time()
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return hit
+
+    def add(self, item):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[str(item)] = time.time() + self.ttl
+            self.added += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        """Merge this run's entries into the stored ones; concurrent runs (e.g. node shards) share the key."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            merged = {k: expires for k, expires in (self.backend.get(self.key) or {}).items() if expires > now}
+            for k, expires in self._entries.items():
+                if expires > now and expires > merged.get(k, 0):
+                    merged[k] = expires
+            self._entries = merged
+            self.backend.set(self.key, merged, timeout=self.ttl)
@@ -0,0 +1,316 @@
+"""Bulk reconciliation of Proxmox data against Nautobot rows.
+
+Existing objects are preloaded and diffed in memory into a ChangePlan; a committed run
+then writes the planned creates/updates with ``bulk_create``/``bulk_update``, while a
+dry run stops after planning and never writes. Note that bulk writes bypass ``save()``,
+so no change-log entries are produced for them.
+"""
+import hashlib
+import json
+
+from django.utils import timezone
+from nautobot.extras.models import CustomField, RelationshipAssociation
+from nautobot.ipam.models import IPAddress
+from nautobot.virtualization.models import VirtualMachine
+
+from .proxmox_config import guest_details
+
+# VirtualMachine custom field holding the fingerprint of the last synced Proxmox payload
+FINGERPRINT_CF = "proxmox_sync_hash"
+# Detail pass: parsed guest config (disks, NICs, CPU) and the config digest it was parsed from
+CONFIG_CF = "proxmox_config"
+CONFIG_DIGEST_CF = "proxmox_config_digest"
+
+
+def vm_fingerprint(node_name, vm, iface_data):
+    """Stable hash of everything the sync consumes for a guest; volatile counters are excluded."""
+    interfaces = sorted(
+        (
+            iface.get("name") or iface.get("iface") or "",
+            (iface.get("hardware-address") or iface.get("hwaddr") or "").lower(),
+            sorted(
+                [f"{ip.get('ip-address')}/{ip.get('prefix')}" for ip in iface.get("ip-addresses") or []]
+                + [iface[key] for key in ("inet", "inet6") if iface.get(key)]
+            ),
+        )
+        for iface in (iface_data if isinstance(iface_data, list) else [])
+    )
+    payload = {
+        "name": vm.get("name"),
+        "vmid": str(vm.get("vmid")),
+        "node": node_name,
+        "type": "lxc" if vm.get("type") == "lxc" else "qemu",
+        "status": vm.get("status"),
+        "cpus": vm.get("cpus"),
+        "maxmem": vm.get("maxmem"),
+        "maxdisk": vm.get("maxdisk"),
+        "interfaces": interfaces,
+        # Set by the detail pass: a config edit alone resyncs the guest
+        "config_digest": (vm.get("config") or {}).get("digest"),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ChangePlan:
+    """Creates/updates/stales per object type, as executed (or, on a dry run, as planned)."""
+
+    def __init__(self):
+        self.changes = {}
+        self.unchanged = {}
+
+    def record(self, object_type, action, **detail):
+        self.changes.setdefault(object_type, {}).setdefault(action, []).append(detail)
+
+    def count_unchanged(self, object_type, count=1):
+        self.unchanged[object_type] = self.unchanged.get(object_type, 0) + count
+
+    def summary(self):
+        summary = {object_type: {action: len(items) for action, items in actions.items()} for object_type, actions in self.changes.items()}
+        for object_type, count in self.unchanged.items():
+            summary.setdefault(object_type, {})["unchanged"] = count
+        return summary
+
+    def as_dict(self, **meta):
+        return {"meta": meta, "summary": self.summary(), "changes": self.changes}
+
+
+class VMReconciler:
+    def __init__(self, cluster, status_active, status_offline, plan, batch_size=200, force_full=False):
+        self.cluster = cluster
+        self.plan = plan
+        self.status_active = status_active
+        self.status_offline = status_offline
+        self.batch_size = batch_size
+        self.force_full = force_full
+        self.configs_unchanged = 0
+        self.configs_updated = 0
+        self.cf_keys = set(CustomField.objects.get_for_model(VirtualMachine).values_list("key", flat=True))
+        self.use_fingerprints = FINGERPRINT_CF in self.cf_keys
+
+        self.by_name = {}
+        self.by_vmid = {}
+        # cluster may be an unsaved stand-in on a dry run, hence the pk filter
+        for vm_obj in VirtualMachine.objects.filter(cluster_id=cluster.pk):
+            self._register(vm_obj, vm_obj.custom_field_data.get("proxmox_vmid"))
+
+    def _register(self, vm_obj, vmid):
+        self.by_name[vm_obj.name] = vm_obj
+        if vmid:
+            self.by_vmid[str(vmid)] = vm_obj
+
+    def diff(self, node_name, vm, fingerprint=None):
+        """Match a Proxmox guest to its VirtualMachine and apply changes in memory only.
+
+        Returns ``(vm_obj, changed_fields, created)``; nothing is written to the database.
+        ``changed_fields`` is None when ``fingerprint`` matches the stored one, meaning the
+        guest is unchanged since the last sync and needs no further work.
+        """
+        vmid = str(vm.get("vmid"))
+        name = vm.get("name")
+        vm_type = "lxc" if vm.get("type") == "lxc" else "qemu"
+        nb_status = self.status_active if vm.get("status") == "running" else self.status_offline
+
+        # Only populate custom fields that are defined for VirtualMachine
+        wanted_cf = {"proxmox_vmid": vmid, "proxmox_node": node_name, "proxmox_vmtype": vm_type}
+        cf_updates = {k: v for k, v in wanted_cf.items() if k in self.cf_keys}
+
+        vm_obj = self.by_name.get(name) or self.by_vmid.get(vmid)
+        if (
+            vm_obj is not None
+            and fingerprint
+            and self.use_fingerprints
+            and not self.force_full
+            and vm_obj.custom_field_data.get(FINGERPRINT_CF) == fingerprint
+        ):
+            self.plan.count_unchanged("virtualization.virtualmachine")
+            return vm_obj, None, False
+
+        # Detail pass: the config is only parsed when Proxmox reports a new digest for it
+        config = vm.get("config")
+        if config and CONFIG_DIGEST_CF in self.cf_keys:
+            stored = vm_obj.custom_field_data.get(CONFIG_DIGEST_CF) if vm_obj is not None else None
+            if self.force_full or config.get("digest") != stored:
+                # Stored with the other custom fields (_custom_field_data), in the same write as the VM itself
+                cf_updates[CONFIG_DIGEST_CF] = config.get("digest")
+                if CONFIG_CF in self.cf_keys:
+                    details = cf_updates[CONFIG_CF] = guest_details(config, vm_type)
+                    self.plan.record(
+                        "virtualization.virtualmachine", "config",
+                        name=name, vmid=vmid, digest=config.get("digest"), previous_digest=stored,
+                        cpu=details["cpu"], disks=len(details["disks"]), nics=len(details["nics"]),
+                    )
+                self.configs_updated += 1
+            else:
+                self.configs_unchanged += 1
+
+        if vm_obj is None:
+            vm_obj = VirtualMachine(
+                name=name,
+                cluster=self.cluster,
+                status=nb_status,
+                vcpus=vm.get("cpus") or 1,
+                memory=int(vm.get("maxmem", 0) / 1024 / 1024),
+                disk=int(vm.get("maxdisk", 0) / 1024 / 1024 / 1024),
+                # custom_field_data is a read-only property on Nautobot 2.x; the model field is _custom_field_data
+                _custom_field_data=cf_updates,
+            )
+            self._register(vm_obj, vmid)
+            self.plan.record(
+                "virtualization.virtualmachine", "create",
+                name=name, vmid=vmid, node=node_name, status=nb_status.name,
+                vcpus=vm_obj.vcpus, memory=vm_obj.memory, disk=vm_obj.disk,
+            )
+            return vm_obj, [], True
+
+        changed = []
+        if vm_obj.name != name:
+            # Matched by VMID: the guest was renamed in Proxmox
+            vm_obj.name = name
+            self.by_name[name] = vm_obj
+            changed.append("name")
+        if vm_obj.status_id != nb_status.pk:
+            vm_obj.status = nb_status
+            changed.append("status")
+
+        sizing = {
+            "vcpus": vm.get("cpus", vm_obj.vcpus),
+            "memory": int(vm.get("maxmem", 0) / 1024 / 1024) if vm.get("maxmem") else vm_obj.memory,
+            "disk": int(vm.get("maxdisk", 0) / 1024 / 1024 / 1024) if vm.get("maxdisk") else vm_obj.disk,
+        }
+        for field, value in sizing.items():
+            if value is not None and getattr(vm_obj, field) != value:
+                setattr(vm_obj, field, value)
+                changed.append(field)
+
+        if any(vm_obj.custom_field_data.get(k) != v for k, v in cf_updates.items()):
+            vm_obj.custom_field_data.update(cf_updates)
+            changed.append("_custom_field_data")
+
+        if changed:
+            self.plan.record(
+                "virtualization.virtualmachine", "update",
+                name=name, vmid=vmid, node=node_name,
+                changes={f: vm_obj.status.name if f == "status" else getattr(vm_obj, f) for f in changed},
+            )
+        else:
+            self.plan.count_unchanged("virtualization.virtualmachine")
+        return vm_obj, changed, False
+
+    def apply(self, creates, updates):
+        """Write new VMs and changed fields. ``updates`` is a list of ``(vm_obj, changed_fields)``."""
+        if creates:
+            VirtualMachine.objects.bulk_create(creates, batch_size=self.batch_size)
+
+        # bulk_update needs one field list per call: group rows by the set of fields that changed
+        now = timezone.now()
+        groups = {}
+        for vm_obj, fields in updates:
+            vm_obj.last_updated = now
+            groups.setdefault(tuple(sorted(fields)), []).append(vm_obj)
+        for fields, objs in groups.items():
+            VirtualMachine.objects.bulk_update(objs, [*fields, "last_updated"], batch_size=self.batch_size)
+
+    def stamp(self, fingerprints):
+        """Persist ``[(vm_obj, fingerprint), ...]`` once a guest has been fully synced."""
+        if not self.use_fingerprints:
+            return
+        stale = [(vm_obj, fp) for vm_obj, fp in fingerprints if vm_obj.custom_field_data.get(FINGERPRINT_CF) != fp]
+        for vm_obj, fp in stale:
+            vm_obj.custom_field_data[FINGERPRINT_CF] = fp
+        if stale:
+            VirtualMachine.objects.bulk_update([vm_obj for vm_obj, _ in stale], ["_custom_field_data"], batch_size=self.batch_size)
+
+
+class IPLinker:
+    """Collects (interface, IP) pairs and upserts IPAddress/RelationshipAssociation rows in bulk.
+
+    Existing IPs and associations for the collected keys are loaded with a handful of
+    queries per flush; only the missing rows are planned and, when committing, inserted
+    with ``ignore_conflicts`` so a concurrent writer can't fail the batch.
+    """
+
+    def __init__(self, status, ip_type, plan, commit=True, batch_size=200):
+        self.status = status
+        self.ip_type = ip_type
+        self.plan = plan
+        self.commit = commit
+        self.batch_size = batch_size
+        self._pairs = []
+
+    def add(self, relationship, source_type, source_id, host, mask_length, parent):
+        self._pairs.append((relationship, source_type, source_id, str(host), int(mask_length), parent))
+
+    def reset(self):
+        """Drop pending pairs, e.g. after the savepoint they belonged to was rolled back."""
+        self._pairs = []
+
+    def _load_ips(self, hosts):
+        return {(str(ip.host), ip.mask_length): ip for ip in IPAddress.objects.filter(host__in=hosts)}
+
+    def flush(self):
+        """Plan (and when committing, write) pending pairs. Returns ``(ips_created, links_created, skipped)``."""
+        pairs, self._pairs = self._pairs, []
+        if not pairs:
+            return 0, 0, 0
+
+        wanted = {(host, mask): parent for _, _, _, host, mask, parent in pairs}
+        ips = self._load_ips({host for host, _ in wanted})
+
+        missing = {
+            (host, mask): IPAddress(address=f"{host}/{mask}", parent=parent, status=self.status)
+            for (host, mask), parent in wanted.items()
+            if (host, mask) not in ips
+        }
+        for host, mask in missing:
+            parent = wanted[(host, mask)]
+            self.plan.record("ipam.ipaddress", "create", address=f"{host}/{mask}", parent=f"{parent.network}/{parent.prefix_length}")
+        if missing and self.commit:
+            IPAddress.objects.bulk_create(missing.values(), batch_size=self.batch_size, ignore_conflicts=True)
+            # With ignore_conflicts the in-memory pks may not be the stored ones: re-read
+            ips.update(self._load_ips({host for host, _ in missing}))
+        elif missing:
+            ips.update(missing)
+
+        links = {}
+        skipped = 0
+        for relationship, source_type, source_id, host, mask, _ in pairs:
+            ip_obj = ips.get((host, mask))
+            if ip_obj is None:
+                # Conflicted with an existing IP of a different mask length under the same parent
+                skipped += 1
+                continue
+            links[(relationship.pk, source_id, ip_obj.pk)] = (relationship, source_type, source_id, ip_obj)
+
+        existing = set()
+        for relationship in {rel for rel, _, _, _ in links.values()}:
+            keys = [k for k in links if k[0] == relationship.pk]
+            existing.update(
+                (relationship.pk, src, dst)
+                for src, dst in RelationshipAssociation.objects.filter(
+                    relationship_id=relationship.pk,
+                    source_id__in={k[1] for k in keys},
+                    destination_id__in={k[2] for k in keys},
+                ).values_list("source_id", "destination_id")
+            )
+
+        new_links = []
+        for key, (relationship, source_type, source_id, ip_obj) in links.items():
+            if key in existing:
+                continue
+            new_links.append(
+                RelationshipAssociation(
+                    relationship=relationship,
+                    source_type=source_type,
+                    source_id=source_id,
+                    destination_type=self.ip_type,
+                    destination_id=ip_obj.pk,
+                )
+            )
+            self.plan.record(
+                "extras.relationshipassociation", "create",
+                relationship=relationship.key, source_id=str(source_id), address=f"{ip_obj.host}/{ip_obj.mask_length}",
+            )
+        if new_links and self.commit:
+            RelationshipAssociation.objects.bulk_create(new_links, batch_size=self.batch_size, ignore_conflicts=True)
+
+        return len(missing), len(new_links), skipped
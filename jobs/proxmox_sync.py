@@ -1,18 +1,98 @@
-from nautobot.apps.jobs import Job, register_jobs, BooleanVar, StringVar
+from nautobot.apps.jobs import Job, register_jobs, BooleanVar, IntegerVar, StringVar
 from nautobot.virtualization.models import VirtualMachine, Cluster, ClusterType, VMInterface
 from nautobot.dcim.models import Device, Interface
-from nautobot.ipam.models import IPAddress, Prefix
-from nautobot.extras.models import Status, Tag, Relationship, RelationshipAssociation
+from nautobot.ipam.models import IPAddress, Prefix, get_default_namespace
+from nautobot.extras.choices import CustomFieldTypeChoices
+from nautobot.extras.models import CustomField, JobResult, Status, Tag, TaggedItem, Relationship
+from nautobot.extras.models import Job as JobModel
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
 import requests
-import urllib3
 import os
 import ipaddress
+import json
+import uuid
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from .discovery import ARP_SOURCE
+from .instrumentation import instrumented
+from .proxmox_client import CircuitOpenError, ProxmoxClient
+from .proxmox_config import agent_enabled, guest_details
+from .prefix_index import PrefixIndex
+from .proxmox_pipeline import FetchPipeline, NegativeCache
+from .proxmox_reconcile import CONFIG_CF, CONFIG_DIGEST_CF, FINGERPRINT_CF, ChangePlan, IPLinker, VMReconciler, vm_fingerprint
+from .proxmox_tasks import TaskWatermark
+from .refcache import ref_cache
+from .snmp import ARP_OID, SNMPEngine, SNMPError, format_mac, reduce_arp
+from .snmp_cache import TableCache
 
 name = "Infrastructure Sync Jobs"
 
+STALE_TAG = "orphaned-from-proxmox"
+AGENT_CACHE_KEY = "proxmox_sync:agent_failures"
+TASK_CACHE_KEY = "proxmox_sync:task_watermark"
+SHARD_CACHE_PREFIX = "proxmox_sync:shards"
+SHARD_CACHE_TTL = 24 * 60 * 60
+
+
+def netmask_to_prefix(netmask):
+    try:
+        return ipaddress.ip_network(f"0.0.0.0/{netmask}").prefixlen
+    except Exception:
+        return None
+
+def parse_ip_addresses(ip_list):
+    for ip in ip_list or []:
+        if ip.get("ip-address-type") != "ipv4":
+            continue
+        ip_addr = ip.get("ip-address")
+        if not ip_addr:
+            continue
+        try:
+            ip_obj = ipaddress.ip_address(ip_addr)
+            if ip_obj.is_loopback or ip_obj.is_link_local:
+                continue
+        except Exception:
+            continue
+
+        prefix = ip.get("prefix")
+        if prefix is None:
+            netmask = ip.get("netmask")
+            if netmask:
+                prefix = netmask_to_prefix(netmask)
+        if prefix is None:
+            prefix = 32
+        yield ip_addr, int(prefix)
+
+def guest_ips(iface):
+    """IPv4 ``(address, prefix)`` pairs of a guest interface in agent ("ip-addresses") or LXC ("inet") format."""
+    yield from parse_ip_addresses(iface.get("ip-addresses", []))
+    for cidr in str(iface.get("inet") or "").split():
+        try:
+            ipi = ipaddress.ip_interface(cidr)
+        except ValueError:
+            continue
+        if ipi.version == 4 and not (ipi.ip.is_loopback or ipi.ip.is_link_local):
+            yield str(ipi.ip), ipi.network.prefixlen
+
+def iface_name(iface):
+    return iface.get("name") or iface.get("iface") or "eth0"
+
+def iface_mac(value):
+    """Normalized MAC of an interface entry (agent, LXC or ARP) or a VMInterface ``mac_address``; None if unset or all zeros (loopback)."""
+    if isinstance(value, dict):
+        value = value.get("hardware-address") or value.get("hwaddr")
+    mac = format_mac(str(value)) if value else None
+    return mac if mac and mac != "00:00:00:00:00:00" else None
+
+def reports_ipv4(iface_data):
+    return any(next(guest_ips(iface), None) for iface in iface_data or [] if isinstance(iface, dict))
+
+def guest_nics(config, vm_type):
+    """``[(name, MAC)]`` from the ``netN`` keys of a guest config (qemu NICs are named netN, LXC ones by name=)."""
+    return sorted((nic["name"], format_mac(nic["mac"])) for nic in guest_details(config, vm_type)["nics"] if nic["mac"])
+
+
 class SyncProxmoxInventory(Job):
     # Job variables (exposed in UI/API)
     proxmox_url = StringVar(required=False, description="Proxmox API URL (e.g. https://172.16.110.101:8006)")
@@ -20,16 +100,65 @@ class SyncProxmoxInventory(Job):
     proxmox_token = StringVar(required=False, description="Proxmox token secret")
     commit = BooleanVar(default=False, description="Apply changes (false = dry-run)")
     mark_stale = BooleanVar(default=True, description="Tag VMs not found in Proxmox")
+    force_full = BooleanVar(default=False, description="Re-sync every VM even if its Proxmox fingerprint is unchanged")
     include_lxc = BooleanVar(default=True, description="Include LXC containers")
     node_filter = StringVar(required=False, description="Filter by Proxmox node name")
     vmid_filter = StringVar(required=False, description="Filter by VMID")
+    incremental = BooleanVar(default=False, description="Only resync guests touched by Proxmox tasks since the last run")
+    full_every_hours = IntegerVar(default=24, min_value=1, description="Incremental mode: run a full reconciliation when the last one is older than this")
+    sharded = BooleanVar(default=False, description="Run one subtask per Proxmox node on the worker pool; stale marking runs once all shards report")
+    shard_deadline = IntegerVar(default=1800, min_value=60, max_value=SHARD_CACHE_TTL, description="Sharded mode: seconds after dispatch when shards that haven't reported count as failed")
+    max_workers = IntegerVar(default=8, min_value=1, description="Concurrent Proxmox API workers")
+    node_concurrency = IntegerVar(default=4, min_value=1, description="Max concurrent API calls per Proxmox node")
+    chunk_size = IntegerVar(default=200, min_value=1, description="Guests per write transaction (each VM gets its own savepoint on retry)")
+    use_cluster_resources = BooleanVar(default=True, description="List guests with one /cluster/resources call (falls back to per-node listing)")
+    agent_retry_ttl = IntegerVar(default=3600, min_value=0, description="Seconds to skip guest-agent calls for VMs whose agent failed (0 = always retry)")
+    arp_ips = BooleanVar(default=True, description="Give guests without agent-reported IPs the IPs their NIC MACs have in the pfSense ARP table")
+    detail_pass = BooleanVar(default=False, description="Read every guest's config and record disks, NICs and CPU type (skipped while the config digest is unchanged)")
+    arp_max_age = IntegerVar(default=300, min_value=0, description="Reuse an ARP table collected (e.g. by cable discovery) within this many seconds (0 = always walk)")
+    api_retries = IntegerVar(default=3, min_value=0, description="Retries for transient Proxmox API failures")
+    breaker_threshold = IntegerVar(default=5, min_value=1, description="Consecutive failures before calls to a Proxmox node fail fast")
+    breaker_cooldown = IntegerVar(default=30, min_value=1, description="Seconds before a failing Proxmox node is probed again")
 
     class Meta:
         name = "Sync Proxmox Inventory"
         description = "Sync VMs and LXCs from Proxmox to Nautobot (Safe Mode)"
         has_sensitive_variables = True
 
-    def run(self, proxmox_url="", proxmox_user="", proxmox_token="", commit=False, mark_stale=True, include_lxc=True, node_filter="", vmid_filter=""):
+    def run(self, proxmox_url="", proxmox_user="", proxmox_token="", commit=False, mark_stale=True, force_full=False, include_lxc=True, node_filter="", vmid_filter="", incremental=False, full_every_hours=24, sharded=False, shard_deadline=1800, max_workers=8, node_concurrency=4, chunk_size=200, use_cluster_resources=True, agent_retry_ttl=3600, arp_ips=True, arp_max_age=300, detail_pass=False, api_retries=3, breaker_threshold=5, breaker_cooldown=30):
+        with instrumented(self):
+            creds = self.credentials(proxmox_url, proxmox_user, proxmox_token)
+            if creds is None:
+                return
+
+            options = {
+                "mark_stale": mark_stale,
+                "force_full": force_full,
+                "include_lxc": include_lxc,
+                "node_filter": node_filter,
+                "vmid_filter": vmid_filter,
+                "incremental": incremental,
+                "full_every_hours": full_every_hours,
+                "max_workers": max_workers,
+                "node_concurrency": node_concurrency,
+                "chunk_size": chunk_size,
+                "use_cluster_resources": use_cluster_resources,
+                "agent_retry_ttl": agent_retry_ttl,
+                "arp_ips": arp_ips,
+                "arp_max_age": arp_max_age,
+                "detail_pass": detail_pass,
+                "breaker_threshold": breaker_threshold,
+                "breaker_cooldown": breaker_cooldown,
+            }
+            if sharded:
+                # Shards resolve empty credentials from their own ENV, so secrets only travel if typed in the UI
+                job_kwargs = {"proxmox_url": proxmox_url, "proxmox_user": proxmox_user, "proxmox_token": proxmox_token, "commit": commit, "api_retries": api_retries, **options}
+                return self.dispatch_shards(creds, api_retries, job_kwargs, shard_deadline)
+
+            self.execute(creds, commit, api_retries, **options)
+            return self.report_plan(proxmox_url=creds[0], node_filter=node_filter, vmid_filter=vmid_filter)
+
+    def credentials(self, proxmox_url, proxmox_user, proxmox_token):
         # Prioritize UI inputs, fallback to ENV
         prox_url = proxmox_url or os.environ.get("PROXMOX_URL") or os.environ.get("NAUTOBOT_PROXMOX_URL")
         prox_user = proxmox_user or os.environ.get("PROXMOX_USER") or os.environ.get("NAUTOBOT_PROXMOX_USER")
@@ -37,42 +166,215 @@ class SyncProxmoxInventory(Job):
         
         if not prox_url or not prox_user or not prox_token:
             self.logger.error("Missing Proxmox credentials. Provide via UI inputs or ENV (PROXMOX_URL/USER/TOKEN).")
-            return
-
-        headers = {"Authorization": f"PVEAPIToken={prox_user}={prox_token}"}
-        verify_tls = False
+            return None
+        return prox_url, prox_user, prox_token
 
+    def execute(self, creds, commit, api_retries, only_node=None, **options):
+        """Run the sync against Proxmox; returns True if every node was listed and processed."""
+        prox_url, prox_user, prox_token = creds
         self.logger.info(f"Connecting to Proxmox: {prox_url}")
 
+        # Every write below is planned first; dry runs stop at the plan and never touch the DB
+        self.commit = commit
+        self.plan = ChangePlan()
+        self.tx_stats = {"committed": 0, "rolled_back": 0, "vms_rolled_back": 0}
+
+        # Per-endpoint HTTP latency ends up in the performance summary
+        client = ProxmoxClient(
+            prox_url, prox_user, prox_token,
+            verify_tls=False,
+            retries=api_retries,
+            pool_size=options["max_workers"],
+            observer=self.metrics.record_call,
+            node_concurrency=options["node_concurrency"],
+            breaker_threshold=options.pop("breaker_threshold", 5),
+            breaker_cooldown=options.pop("breaker_cooldown", 30),
+        )
+        with client:
+            self.client = client
+            completed = self.sync(only_node=only_node, **options)
+            self.log_client_events()
+            open_circuits = client.open_circuits()
+            if open_circuits:
+                self.logger.warning(f"Proxmox nodes with open circuit breakers at end of run: {', '.join(open_circuits)}")
+        if commit:
+            tx = self.tx_stats
+            self.logger.info(f"Transactions: {tx['committed']} chunks committed, {tx['rolled_back']} rolled back, {tx['vms_rolled_back']} VMs rolled back individually")
+        return completed
+
+    def log_client_events(self):
+        """Log circuit breaker transitions and concurrency cuts queued by the fetch workers."""
+        for node_name, message in self.client.drain_events():
+            self.logger.warning(f"Proxmox node {node_name}: {message}")
+
+    def report_plan(self, **meta):
+        summary = self.plan.summary()
+        self.logger.info(
+            ("Applied" if self.commit else "[Dry-Run] Planned") + " changes:\n"
+            + ("\n".join(f"{object_type}: {counts}" for object_type, counts in summary.items()) or "none")
+        )
+        plan = self.plan.as_dict(committed=self.commit, transactions=self.tx_stats, **meta)
+        self.create_file("proxmox-change-plan.json", json.dumps(plan, indent=2, default=str))
+        return summary
+
+    # ---------------------------------------------------------
+    # Sharded mode: one SyncProxmoxNode subtask per node, fan-in by the last shard
+    # or, for shards that never report, by SyncProxmoxShardDeadline
+    # ---------------------------------------------------------
+    def dispatch_shards(self, creds, api_retries, job_kwargs, shard_deadline=1800):
+        prox_url, prox_user, prox_token = creds
         try:
-            nodes_resp = requests.get(f"{prox_url}/api2/json/nodes", headers=headers, verify=verify_tls, timeout=10)
-            nodes_resp.raise_for_status()
-            nodes = nodes_resp.json().get("data", [])
+            with ProxmoxClient(prox_url, prox_user, prox_token, verify_tls=False, retries=api_retries, observer=self.metrics.record_call) as client, self.metrics.phase("node_fetch"):
+                nodes = client.get("/nodes") or []
         except Exception as e:
             self.logger.error(f"Failed to fetch nodes: {e}")
             return
 
-        # Status mapping
+        node_filter = job_kwargs["node_filter"]
+        node_names = [n["node"] for n in nodes if n.get("node") and (not node_filter or node_filter in n["node"])]
+        if not node_names:
+            self.logger.warning("No Proxmox nodes to shard" + (f" matching '{node_filter}'" if node_filter else ""))
+            return
+
+        shard_model = JobModel.objects.filter(module_name=SyncProxmoxNode.__module__, job_class_name=SyncProxmoxNode.__name__).first()
+        if shard_model is None or not shard_model.enabled:
+            self.logger.error(f"Job '{SyncProxmoxNode.Meta.name}' must be installed and enabled to use sharded mode")
+            return
+        deadline_model = JobModel.objects.filter(module_name=SyncProxmoxShardDeadline.__module__, job_class_name=SyncProxmoxShardDeadline.__name__).first()
+        if deadline_model is None or not deadline_model.enabled:
+            self.logger.error(f"Job '{SyncProxmoxShardDeadline.Meta.name}' must be installed and enabled to use sharded mode")
+            return
+
+        batch_id = uuid.uuid4().hex
+        batch_key = f"{SHARD_CACHE_PREFIX}:{batch_id}"
+        cache.set(
+            batch_key,
+            {
+                "nodes": node_names,
+                "commit": job_kwargs["commit"],
+                # A filtered run only sees part of the cluster, so it must never mark anything stale
+                "mark_stale": job_kwargs["mark_stale"] and not node_filter and not job_kwargs["vmid_filter"],
+            },
+            SHARD_CACHE_TTL,
+        )
+
+        if job_kwargs["incremental"]:
+            self.logger.info("Incremental mode is not supported with sharding; shards run a full sync of their node")
+        shard_kwargs = {**job_kwargs, "node_filter": "", "mark_stale": False, "use_cluster_resources": False, "incremental": False}
+        shards = {}
+        for node_name in node_names:
+            try:
+                job_result = JobResult.enqueue_job(shard_model, self.user, shard_node=node_name, batch_id=batch_id, **shard_kwargs)
+                shards[node_name] = str(job_result.pk)
+                self.logger.info(f"Dispatched shard for node {node_name}: job result {job_result.pk}")
+            except Exception as e:
+                # Record the failure so the fan-in still completes and reports it
+                cache.set(f"{batch_key}:{node_name}", {"ok": False, "error": f"dispatch failed: {e}", "seen": []}, SHARD_CACHE_TTL)
+                self.logger.error(f"Failed to dispatch shard for node {node_name}: {e}")
+
+        # Shards killed by the time limit or a lost worker never report; this fan-in counts them as failed
         try:
-            status_active = Status.objects.get(name="Active")
-            status_offline = Status.objects.get(name="Offline")
-            status_stale = Status.objects.get(name="Stale") if Status.objects.filter(name="Stale").exists() else status_offline
+            deadline = JobResult.enqueue_job(deadline_model, self.user, batch_id=batch_id, celery_kwargs={"countdown": shard_deadline})
+            self.logger.info(f"Shard batch {batch_id}: deadline fan-in in {shard_deadline}s (job result {deadline.pk})")
         except Exception as e:
-             self.logger.error(f"Status objects missing in Nautobot: {e}")
-             return
+            self.logger.error(f"Failed to schedule the deadline fan-in for shard batch {batch_id}; it completes only if every shard reports: {e}")
+
+        self.logger.info(f"Shard batch {batch_id}: {len(shards)}/{len(node_names)} node shards queued; the last shard to finish runs stale marking")
+        return {"batch_id": batch_id, "shards": shards}
+
+    def report_shard(self, batch_id, node_name, ok, error=""):
+        """Store this shard's outcome; the shard that completes the batch runs the fan-in once."""
+        batch_key = f"{SHARD_CACHE_PREFIX}:{batch_id}"
+        seen = sorted(name for name in getattr(self, "active_vm_names", ()) if name)
+        cache.set(f"{batch_key}:{node_name}", {"ok": ok, "error": error, "seen": seen}, SHARD_CACHE_TTL)
+        self.complete_batch(batch_id, reporter=node_name)
+
+    def complete_batch(self, batch_id, reporter=None):
+        """Run the batch fan-in once every shard has reported or, when ``reporter`` is None, at the deadline."""
+        batch_key = f"{SHARD_CACHE_PREFIX}:{batch_id}"
+        batch = cache.get(batch_key)
+        if batch is None:
+            self.logger.warning(f"Shard batch {batch_id} expired from cache; fan-in skipped")
+            return
+        results = cache.get_many([f"{batch_key}:{n}" for n in batch["nodes"]])
+        pending = [n for n in batch["nodes"] if f"{batch_key}:{n}" not in results]
+        if pending and reporter is not None:
+            self.logger.info(f"Shard {reporter} reported; waiting on {len(pending)} shards: {', '.join(pending)}")
+            return
+        if not cache.add(f"{batch_key}:fanin", True, SHARD_CACHE_TTL):
+            if reporter is None:
+                self.logger.info(f"Shard batch {batch_id}: every shard reported before the deadline; nothing to do")
+            return  # The fan-in already ran (or is running) elsewhere
+
+        missing = {"ok": False, "error": "no report before the deadline (time limit hit or worker lost)", "seen": []}
+        results = {n: results.get(f"{batch_key}:{n}", missing) for n in batch["nodes"]}
+        failed = {n: r["error"] for n, r in results.items() if not r["ok"]}
+        for n, r in results.items():
+            if r["ok"]:
+                self.logger.info(f"Shard {n}: ok, {len(r['seen'])} guests seen")
+            else:
+                self.logger.error(f"Shard {n}: failed: {r['error']}")
+
+        if not batch["mark_stale"]:
+            return
+        if failed:
+            self.logger.warning(f"Skipping stale marking: {len(failed)} shards failed ({', '.join(failed)})")
+            return
+        if not hasattr(self, "status_stale"):
+            self.logger.warning("Skipping stale marking: this job did not finish its setup")
+            return
+        merged = set().union(*(r["seen"] for r in results.values()))
+        self.logger.info(f"Fan-in: marking stale against {len(merged)} guests seen across {len(results)} shards")
+        self.mark_stale_vms(merged, self.status_stale)
+
+    def resolve(self, model, lookup, defaults=None):
+        """get_or_create on a committed run; on a dry run the existing row or an unsaved stand-in.
+
+        Existing rows come from the process-level reference cache, so repeat runs skip the queries.
+        """
+        defaults = defaults or {}
+        if self.commit:
+            obj, created = ref_cache.get_or_create(model, defaults, **lookup)
+        else:
+            obj = ref_cache.get(model, **lookup)
+            created = obj is None
+            if created:
+                obj = model(**lookup, **defaults)
+        if created:
+            self.plan.record(model._meta.label_lower, "create", **{k: str(v) for k, v in lookup.items()})
+        return obj
+
+    def sync(self, mark_stale, force_full, include_lxc, node_filter, vmid_filter, max_workers, node_concurrency, chunk_size, use_cluster_resources, agent_retry_ttl, arp_ips=True, arp_max_age=300, detail_pass=False, incremental=False, full_every_hours=24, only_node=None):
+        commit = self.commit
+        self.active_vm_names = active_vm_names = set()
+        try:
+            with self.metrics.phase("node_fetch"):
+                nodes = self.client.get("/nodes") or []
+        except Exception as e:
+            self.logger.error(f"Failed to fetch nodes: {e}")
+            return False
+
+        # Status mapping
+        status_active = ref_cache.get(Status, name="Active")
+        status_offline = ref_cache.get(Status, name="Offline")
+        status_stale = ref_cache.get(Status, name="Stale") or status_offline
+        if status_active is None or status_offline is None:
+            self.logger.error("Status objects missing in Nautobot: Active and Offline are required")
+            return False
 
         # Ensure Cluster exists
-        ctype, _ = ClusterType.objects.get_or_create(name="Proxmox")
-        cluster, _ = Cluster.objects.get_or_create(name="HomeLab Proxmox", defaults={"cluster_type": ctype})
+        ctype = self.resolve(ClusterType, {"name": "Proxmox"})
+        cluster = self.resolve(Cluster, {"name": "HomeLab Proxmox"}, {"cluster_type": ctype})
 
         # Relationship setup
         iface_ct = ContentType.objects.get_for_model(Interface)
         vm_iface_ct = ContentType.objects.get_for_model(VMInterface)
         ip_ct = ContentType.objects.get_for_model(IPAddress)
 
-        iface_rel, _ = Relationship.objects.get_or_create(
-            key="interface_ip",
-            defaults={
+        iface_rel = self.resolve(
+            Relationship,
+            {"key": "interface_ip"},
+            {
                 "label": "Interface IP",
                 "type": "one-to-many",
                 "required_on": "",
@@ -83,9 +385,10 @@ class SyncProxmoxInventory(Job):
             },
         )
 
-        vm_iface_rel, _ = Relationship.objects.get_or_create(
-            key="vm_interface_ip",
-            defaults={
+        vm_iface_rel = self.resolve(
+            Relationship,
+            {"key": "vm_interface_ip"},
+            {
                 "label": "VM Interface IP",
                 "type": "one-to-many",
                 "required_on": "",
@@ -96,261 +399,673 @@ class SyncProxmoxInventory(Job):
             },
         )
 
-        def netmask_to_prefix(netmask):
-            try:
-                return ipaddress.ip_network(f"0.0.0.0/{netmask}").prefixlen
-            except Exception:
-                return None
+        if commit:
+            self.ensure_fingerprint_field()
+            if detail_pass:
+                self.ensure_detail_fields()
 
-        def parse_ip_addresses(ip_list):
-            for ip in ip_list or []:
-                if ip.get("ip-address-type") != "ipv4":
-                    continue
-                ip_addr = ip.get("ip-address")
-                if not ip_addr:
-                    continue
-                try:
-                    ip_obj = ipaddress.ip_address(ip_addr)
-                    if ip_obj.is_loopback or ip_obj.is_link_local:
-                        continue
-                except Exception:
-                    continue
+        self.status_active = status_active
+        self.status_offline = status_offline
+        self.status_stale = status_stale
+        self.cluster = cluster
+        self.iface_rel = iface_rel
+        self.vm_iface_rel = vm_iface_rel
+        self.iface_ct = iface_ct
+        self.vm_iface_ct = vm_iface_ct
+        self.ip_ct = ip_ct
+        self.vmid_filter = vmid_filter
+        self.detail_pass = detail_pass
+        self.agent_failures = NegativeCache(cache, AGENT_CACHE_KEY, agent_retry_ttl)
+        # MAC -> IPs, read by the fetch workers to give agentless guests their addresses
+        self.guest_arp = self.load_guest_arp(arp_max_age) if arp_ips else {}
+
+        # Parent-prefix checks for every synced IP are answered from memory
+        self.ip_linker = IPLinker(status_active, ip_ct, self.plan, commit=commit, batch_size=chunk_size)
+        self.prefix_index = PrefixIndex.from_queryset(Prefix.objects.filter(namespace=get_default_namespace()))
+        self.logger.info(f"Indexed {len(self.prefix_index)} prefixes")
 
-                prefix = ip.get("prefix")
-                if prefix is None:
-                    netmask = ip.get("netmask")
-                    if netmask:
-                        prefix = netmask_to_prefix(netmask)
-                if prefix is None:
-                    prefix = 32
-                yield ip_addr, int(prefix)
+        # Incremental mode: targets is the set of VMIDs to resync, None means a full reconciliation
+        task_state, tasks, targets = None, None, None
+        if incremental:
+            if node_filter or vmid_filter or only_node:
+                self.logger.info("Incremental mode ignored: node/VMID filters already limit the run")
+            else:
+                task_state, tasks, targets = self.incremental_targets(nodes, full_every_hours, force_full)
 
-        active_vm_names = set()
+        # Whole-cluster guest listing in one round trip; None means use the per-node path
+        if use_cluster_resources or targets is not None:
+            with self.metrics.phase("vm_list"):
+                guests_by_node = self.fetch_cluster_guests(include_lxc)
+        else:
+            guests_by_node = None
+        if targets is not None:
+            if guests_by_node is None:
+                self.logger.warning("Incremental mode needs /cluster/resources; running a full reconciliation")
+                targets = None
+            else:
+                guests_by_node = {node: [vm for vm in vms if int(vm.get("vmid") or 0) in targets] for node, vms in guests_by_node.items()}
 
+        # ---------------------------------------------------------
+        # Fetch stage: worker pool talks to Proxmox concurrently
+        # ---------------------------------------------------------
+        # Per-node slots follow the client's AIMD limit; tasks over it queue without holding a worker
+        pipeline = FetchPipeline(max_workers=max_workers, node_concurrency=node_concurrency, node_limit=self.client.node_limit)
         for node_info in nodes:
             node_name = node_info.get("node")
             if node_filter and node_filter not in node_name:
                 continue
-                
+            if only_node and node_name != only_node:
+                continue
+            if targets is not None:
+                # Only touched guests; host interfaces are left to the periodic full run
+                if guests_by_node.get(node_name):
+                    pipeline.submit(node_name, self.dispatch_guests, pipeline, node_name, guests_by_node[node_name])
+                continue
+
             self.logger.info(f"Scanning Node: {node_name}")
+            pipeline.submit(node_name, self.fetch_node_network, pipeline, node_name)
+            if guests_by_node is not None:
+                pipeline.submit(node_name, self.dispatch_guests, pipeline, node_name, guests_by_node.get(node_name, []))
+            else:
+                pipeline.submit(node_name, self.fetch_node_guests, pipeline, node_name, "qemu")
+                if include_lxc:
+                    pipeline.submit(node_name, self.fetch_node_guests, pipeline, node_name, "lxc")
+
+        # ---------------------------------------------------------
+        # Plan/write stage: single consumer owns all DB access
+        # ---------------------------------------------------------
+        reconciler = VMReconciler(cluster, status_active, status_offline, self.plan, batch_size=chunk_size, force_full=force_full)
+        listing_failed = set()
+        pending = []
+        for kind, node_name, payload in pipeline.messages():
+            self.log_client_events()
+            if kind == "network":
+                with self.metrics.phase("db_write"):
+                    self.sync_host_interfaces(node_name, payload)
+            elif kind == "guest":
+                vm, iface_data = payload
+                active_vm_names.add(vm.get("name"))
+                pending.append((node_name, vm, iface_data))
+                if len(pending) >= chunk_size:
+                    with self.metrics.phase("db_write"):
+                        self.sync_guests(reconciler, pending)
+                    pending = []
+            elif kind == "listing_error":
+                listing_failed.add(node_name)
+                self.logger.error(payload)
+            elif kind == "error":
+                self.logger.warning(payload)
+        if pending:
+            with self.metrics.phase("db_write"):
+                self.sync_guests(reconciler, pending)
+
+        unchanged = self.plan.unchanged.get("virtualization.virtualmachine", 0)
+        if unchanged:
+            self.logger.info(f"{unchanged} VMs unchanged since last sync")
+        if detail_pass:
+            self.logger.info(
+                f"Detail pass: {reconciler.configs_updated} guest configs {'stored' if commit else 'to store'}, "
+                f"{reconciler.configs_unchanged} skipped (digest unchanged)"
+            )
 
-            # ---------------------------------------------------------
-            # Sync Host Interfaces (Device level)
-            # ---------------------------------------------------------
+        agent_failures = self.agent_failures
+        self.logger.info(
+            f"Guest agent negative cache: {agent_failures.hits} hits, {agent_failures.misses} misses, "
+            f"{agent_failures.added} newly cached, {len(agent_failures)} entries"
+        )
+        agent_failures.save()
+
+        if listing_failed:
+            self.logger.error(f"Guest listing failed for nodes: {', '.join(sorted(listing_failed))}")
+
+        # Stale marking
+        if mark_stale:
+            if node_filter or vmid_filter:
+                self.logger.info("Skipping stale marking: node/VMID filter active, so the seen set is partial")
+            elif listing_failed:
+                self.logger.warning("Skipping stale marking: guest listing incomplete")
+            else:
+                self.mark_stale_vms(active_vm_names, status_stale, vmids=targets)
+
+        if task_state is not None and commit:
+            tx = self.tx_stats
+            if listing_failed or tx["rolled_back"] or tx["vms_rolled_back"]:
+                self.logger.warning("Task-log watermark not advanced: this run had failures, so its guests are retried next run")
+            else:
+                task_state.advance(tasks, full=targets is None)
+                task_state.save()
+
+        return not listing_failed
+
+    def incremental_targets(self, nodes, full_every_hours, force_full):
+        """Return ``(watermark, tasks, vmids)``; ``vmids`` is None when a full reconciliation should run."""
+        state = TaskWatermark(cache, f"{TASK_CACHE_KEY}:{self.cluster.name}")
+        try:
+            with self.metrics.phase("task_log"):
+                tasks = self.client.get("/cluster/tasks") or []
+        except Exception as e:
+            self.logger.warning(f"Cannot read /cluster/tasks ({e}); running a full reconciliation")
+            return None, None, None
+
+        if force_full or state.full_due(full_every_hours * 3600):
+            self.logger.info("Incremental mode: full reconciliation due")
+            return state, tasks, None
+
+        touched, oldest = state.collect(tasks)
+        if oldest is None or oldest > state.since:
+            # The cluster log only keeps recent entries; read each node's archive back to the mark
+            for node_info in nodes:
+                node_name = node_info.get("node")
+                try:
+                    with self.metrics.phase("task_log"):
+                        node_tasks = self.client.get(f"/nodes/{node_name}/tasks", params={"since": state.since, "limit": 10000, "source": "all"}) or []
+                except Exception as e:
+                    self.logger.warning(f"Cannot read task log of {node_name} ({e}); running a full reconciliation")
+                    return state, tasks, None
+                for vmid, types in state.collect(node_tasks)[0].items():
+                    touched.setdefault(vmid, set()).update(types)
+                tasks.extend(node_tasks)
+
+        self.logger.info(
+            f"Incremental mode: {len(touched)} guests touched since the last run"
+            + (": " + ", ".join(f"{vmid} ({'/'.join(sorted(types))})" for vmid, types in sorted(touched.items())[:50]) if touched else "")
+        )
+        return state, tasks, set(touched)
+
+    def load_guest_arp(self, max_age):
+        """``{MAC: [IP, ...]}`` from the pfSense ARP table, reusing the copy cached by cable discovery when fresh."""
+        tables = TableCache(cache, max_age)
+        arp = tables.fresh(ARP_SOURCE.host, ARP_OID)
+        if arp is None:
             try:
-                # Find the Device object for this node
-                device = Device.objects.get(name=node_name)
-                
-                # Fetch Node Network
-                net_resp = requests.get(f"{prox_url}/api2/json/nodes/{node_name}/network", headers=headers, verify=verify_tls, timeout=10)
-                if net_resp.status_code == 200:
-                    net_items = net_resp.json().get("data", [])
-                    for net in net_items:
-                        iface_name = net.get("iface")
-                        if not iface_name:
-                            continue
-                        # Only interested in Linux Bridges (vmbr*) or VLAN subinterfaces
-                        if not (iface_name.startswith("vmbr") or "." in iface_name):
-                            continue
-
-                        iface_type = "virtual" # Default fallback
-                        if iface_name.startswith("vmbr"):
-                            iface_type = "bridge"
-                        
-                        try:
-                            # Upsert Interface
-                            iface, created = Interface.objects.get_or_create(
-                                device=device,
-                                name=iface_name,
-                                defaults={
-                                    "type": iface_type,
-                                    "enabled": True,
-                                    "mtu": 1500, # Default, could parse if available
-                                    "status": status_active
-                                }
-                            )
-                            
-                            if commit:
-                                # Update IP if present in 'cidr'
-                                cidr = net.get("cidr") # IPv4 CIDR
-                                if cidr:
-                                    try:
-                                        ipi = ipaddress.ip_interface(cidr)
-                                        if not Prefix.objects.filter(network__net_contains_or_equals=str(ipi.ip)).exists():
-                                            self.logger.info(f"Skipping IP {cidr}: no parent Prefix")
-                                        else:
-                                            ip_obj, _ = IPAddress.objects.get_or_create(
-                                                host=str(ipi.ip),
-                                                mask_length=int(ipi.network.prefixlen),
-                                                defaults={"status": status_active}
-                                            )
-                                            RelationshipAssociation.objects.get_or_create(
-                                                relationship=iface_rel,
-                                                source_type=iface_ct,
-                                                source_id=iface.id,
-                                                destination_type=ip_ct,
-                                                destination_id=ip_obj.id,
-                                            )
-                                    except Exception as ex:
-                                        self.logger.warning(f"Failed to process IP {cidr}: {ex}")
-
-                                action = "Created" if created else "Updated"
-                                self.logger.info(f"{action} Host Interface: {iface_name} on {node_name}")
-                            else:
-                                self.logger.info(f"[Dry-Run] Would sync Interface: {iface_name} on {node_name}")
-                                
-                        except Exception as e:
-                            self.logger.warning(f"Error syncing interface {iface_name}: {e}")
-            
-            except Device.DoesNotExist:
-                self.logger.warning(f"Device object '{node_name}' not found in Nautobot. Skipping interface sync.")
-            except Exception as e:
-                self.logger.error(f"Failed host network sync for {node_name}: {e}")
+                with self.metrics.phase("arp_walk"):
+                    arp = reduce_arp(SNMPEngine(observer=self.metrics.record_call).stream(ARP_SOURCE, ARP_OID))
+            except SNMPError as e:
+                self.logger.warning(f"ARP table unavailable, guests without agent data get no IPs this run: {e}")
+                return {}
+            tables.store(ARP_SOURCE.host, ARP_OID, arp)
+        by_mac = {}
+        for ip, mac in arp.items():
+            by_mac.setdefault(mac, []).append(ip)
+        self.logger.info(f"ARP table: {len(arp)} entries for {len(by_mac)} MACs ({'cached' if tables.hits else 'walked'})")
+        return by_mac
+
+    def mark_stale_vms(self, active_vm_names, status_stale, vmids=None):
+        """Tag cluster VMs missing from ``active_vm_names``; ``vmids`` limits the check to those guests."""
+        with self.metrics.phase("stale_marking"):
+            self._mark_stale_vms(active_vm_names, status_stale, vmids)
+
+    def _mark_stale_vms(self, active_vm_names, status_stale, vmids=None):
+        try:
+            tag = self.resolve(Tag, {"name": STALE_TAG}, {"color": "ff0000"})
+        except Exception as e:
+            self.logger.warning(f"Cannot mark stale VMs, tag {STALE_TAG} unavailable: {e}")
+            return
 
-            # ---------------------------------------------------------
-            # VM Sync Logic
-            # ---------------------------------------------------------
-            vms = []
-            # QEMU
+        vm_ct = ContentType.objects.get_for_model(VirtualMachine)
+        seen = {name for name in active_vm_names if name}
+        cluster_vms = VirtualMachine.objects.filter(cluster_id=self.cluster.pk)
+        if vmids is not None:
+            cluster_vms = cluster_vms.filter(_custom_field_data__proxmox_vmid__in=[str(v) for v in vmids])
+        tagged = TaggedItem.objects.filter(tag_id=tag.pk, content_type=vm_ct)
+
+        # Tag VMs that vanished from Proxmox and aren't tagged yet
+        newly_stale = list(
+            cluster_vms.exclude(name__in=seen)
+            .exclude(status=status_stale)
+            .exclude(pk__in=tagged.values("object_id"))
+            .values_list("pk", "name")
+        )
+        for _, vm_name in newly_stale:
+            self.plan.record("virtualization.virtualmachine", "stale", name=vm_name, tag=STALE_TAG)
+            self.logger.warning(f"{'Marked' if self.commit else '[Dry-Run] Would mark'} stale: {vm_name}")
+
+        # Un-tag VMs that are back in Proxmox
+        revived = tagged.filter(object_id__in=cluster_vms.filter(name__in=seen).values("pk"))
+        for vm_name in cluster_vms.filter(pk__in=revived.values("object_id")).values_list("name", flat=True):
+            self.plan.record("virtualization.virtualmachine", "unstale", name=vm_name, tag=STALE_TAG)
+
+        if self.commit:
+            with transaction.atomic():
+                TaggedItem.objects.bulk_create(
+                    [TaggedItem(tag=tag, content_type=vm_ct, object_id=pk) for pk, _ in newly_stale],
+                    ignore_conflicts=True,
+                )
+                revived_count, _ = revived.delete()
+            if revived_count:
+                self.logger.info(f"Removed {STALE_TAG} tag from {revived_count} VMs seen in Proxmox again")
+
+    # ---------------------------------------------------------
+    # Fetch stage (worker threads: Proxmox API only, no ORM/logging)
+    # ---------------------------------------------------------
+    def fetch_node_network(self, pipeline, node_name):
+        with self.metrics.phase("node_fetch"):
+            net_items = self.client.get(f"/nodes/{node_name}/network") or []
+        pipeline.emit("network", node_name, net_items)
+
+    def fetch_cluster_guests(self, include_lxc):
+        try:
+            resources = self.client.get("/cluster/resources", params={"type": "vm"}) or []
+        except Exception as e:
+            self.logger.info(f"/cluster/resources unavailable ({e}); falling back to per-node guest listing")
+            return None
+
+        guests_by_node = {}
+        for vm in resources:
+            if vm.get("type") not in ("qemu", "lxc") or (vm["type"] == "lxc" and not include_lxc):
+                continue
+            # The cluster view reports vCPUs as maxcpu; the per-node listing calls it cpus
+            vm.setdefault("cpus", vm.get("maxcpu"))
+            guests_by_node.setdefault(vm.get("node"), []).append(vm)
+        self.logger.info(f"Cluster inventory: {sum(len(v) for v in guests_by_node.values())} guests on {len(guests_by_node)} nodes")
+        return guests_by_node
+
+    def fetch_node_guests(self, pipeline, node_name, vm_type):
+        try:
+            with self.metrics.phase("vm_list"):
+                vms = self.client.get(f"/nodes/{node_name}/{vm_type}") or []
+        except Exception as e:
+            pipeline.emit("listing_error", node_name, f"Failed to list {vm_type} guests on {node_name}: {e}")
+            return
+        if vm_type == "lxc":
+            for vm in vms:
+                vm.setdefault("type", "lxc")
+        self.dispatch_guests(pipeline, node_name, vms)
+
+    def dispatch_guests(self, pipeline, node_name, vms):
+        for vm in vms:
+            if self.vmid_filter and str(self.vmid_filter) != str(vm.get("vmid")):
+                continue
+            # Interfaces are only reported by running guests; a stopped VM's agent call just times out
+            running = vm.get("name") and vm.get("status") == "running"
+            skip_agent = bool(running) and vm.get("type") != "lxc" and vm.get("vmid") in self.agent_failures
+            # The detail pass, and ARP data for a guest whose agent is known to fail, still need the config
+            if (running and not (skip_agent and not self.guest_arp)) or (self.detail_pass and vm.get("name")):
+                pipeline.submit(node_name, self.fetch_guest_interfaces, pipeline, node_name, vm, skip_agent)
+            else:
+                pipeline.emit("guest", node_name, (vm, None))
+
+    def fetch_guest_interfaces(self, pipeline, node_name, vm, skip_agent=False):
+        with self.metrics.phase("guest_agent"):
+            self._fetch_guest_interfaces(pipeline, node_name, vm, skip_agent)
+
+    def _fetch_guest_interfaces(self, pipeline, node_name, vm, skip_agent=False):
+        vmid = vm.get("vmid")
+        vm_type = "lxc" if vm.get("type") == "lxc" else "qemu"
+        running = vm.get("status") == "running"
+        iface_data, config = ([] if running else None), None
+        try:
+            if vm_type == "qemu" or self.detail_pass:
+                # One config read answers "is the agent enabled", "which MACs do the NICs have" and the detail pass
+                config = self.client.get(f"/nodes/{node_name}/{vm_type}/{vmid}/config") or {}
+                if self.detail_pass:
+                    vm["config"] = config
+            if running and vm_type == "lxc":
+                path = f"/nodes/{node_name}/lxc/{vmid}/interfaces"
+            elif running and not skip_agent and agent_enabled(config.get("agent")):
+                path = f"/nodes/{node_name}/qemu/{vmid}/agent/network-get-interfaces"
+            else:
+                path, iface_data = None, None
+            if path:
+                # A missing/stopped agent is not transient; don't burn retries on it
+                payload = self.client.get(path, retries=0) or {}
+                iface_data = payload.get("result", payload) if isinstance(payload, dict) else payload
+        except CircuitOpenError:
+            # The node is failing fast; the breaker transition is logged once rather than per guest
+            pipeline.emit("guest", node_name, (vm, iface_data))
+            return
+        except (requests.HTTPError, requests.Timeout):
+            # Agent not installed/responding: remember it so the next runs don't wait on it again
+            if vm_type == "qemu" and running and config is not None:
+                self.agent_failures.add(vmid)
+        except Exception as ex:
+            pipeline.emit("error", node_name, f"Failed guest IP fetch for {vm.get('name')}: {ex}")
+
+        # No config means the node didn't answer; don't ask it again for the MACs
+        if running and self.guest_arp and (vm_type == "lxc" or config is not None) and not reports_ipv4(iface_data):
+            iface_data = self.arp_interfaces(node_name, vm, vm_type, config) or iface_data
+        pipeline.emit("guest", node_name, (vm, iface_data))
+
+    def arp_interfaces(self, node_name, vm, vm_type, config=None):
+        """Agent-format interface list built from the guest's config NIC MACs and the ARP table (worker thread)."""
+        if config is None:
             try:
-                qemu = requests.get(f"{prox_url}/api2/json/nodes/{node_name}/qemu", headers=headers, verify=verify_tls, timeout=10)
-                vms.extend(qemu.json().get("data", []))
-            except: pass
+                config = self.client.get(f"/nodes/{node_name}/{vm_type}/{vm.get('vmid')}/config") or {}
+            except Exception:
+                return None
+        interfaces = []
+        for nic_name, mac in guest_nics(config, vm_type):
+            ips = self.guest_arp.get(mac)
+            if ips:
+                interfaces.append({
+                    "name": nic_name,
+                    "hardware-address": mac,
+                    "ip-addresses": [{"ip-address-type": "ipv4", "ip-address": ip} for ip in sorted(ips)],
+                    "source": "arp",
+                })
+        return interfaces
+
+    # ---------------------------------------------------------
+    # Write stage (job thread)
+    # ---------------------------------------------------------
+    def sync_host_interfaces(self, node_name, net_items):
+        # Find the Device object for this node
+        device = Device.objects.filter(name=node_name).first()
+        if device is None:
+            self.logger.warning(f"Device object '{node_name}' not found in Nautobot. Skipping interface sync.")
+            return
+
+        wanted = []
+        for net in net_items:
+            iface_name = net.get("iface")
+            if not iface_name:
+                continue
+            # Only interested in Linux Bridges (vmbr*) or VLAN subinterfaces
+            if not (iface_name.startswith("vmbr") or "." in iface_name):
+                continue
+            wanted.append((iface_name, net))
+
+        # One transaction per node; each new interface is saved under its own savepoint
+        try:
+            with transaction.atomic():
+                self.write_host_interfaces(node_name, device, wanted)
+                self.flush_ip_links()
+        except Exception as ex:
+            self.ip_linker.reset()
+            self.logger.warning(f"Rolled back host interface sync for {node_name}: {ex}")
+            if self.commit:
+                self.tx_stats["rolled_back"] += 1
+            return
+        if self.commit:
+            self.tx_stats["committed"] += 1
+
+    def write_host_interfaces(self, node_name, device, wanted):
+        existing = {i.name: i for i in Interface.objects.filter(device=device, name__in=[n for n, _ in wanted])}
+        for iface_name, net in wanted:
+            iface = existing.get(iface_name)
+            if iface is None:
+                iface = Interface(
+                    device=device,
+                    name=iface_name,
+                    type="bridge" if iface_name.startswith("vmbr") else "virtual",
+                    enabled=True,
+                    mtu=1500, # Default, could parse if available
+                    status=self.status_active,
+                )
+                self.plan.record("dcim.interface", "create", device=node_name, name=iface_name, type=iface.type)
+                if self.commit:
+                    try:
+                        with transaction.atomic():
+                            iface.save()
+                        self.logger.info(f"Created Host Interface: {iface_name} on {node_name}")
+                    except Exception as e:
+                        self.logger.warning(f"Error syncing interface {iface_name}: {e}")
+                        continue
+                else:
+                    self.logger.info(f"[Dry-Run] Would create Interface: {iface_name} on {node_name}")
+            else:
+                self.plan.count_unchanged("dcim.interface")
 
-            # LXC
-            if include_lxc:
+            # Update IP if present in 'cidr'
+            cidr = net.get("cidr") # IPv4 CIDR
+            if cidr:
                 try:
-                    lxc = requests.get(f"{prox_url}/api2/json/nodes/{node_name}/lxc", headers=headers, verify=verify_tls, timeout=10)
-                    vms.extend(lxc.json().get("data", []))
-                except: pass
+                    ipi = ipaddress.ip_interface(cidr)
+                    parent = self.prefix_index.lookup(ipi.ip)
+                    if parent is None:
+                        self.logger.info(f"Skipping IP {cidr}: no parent Prefix")
+                    else:
+                        self.ip_linker.add(self.iface_rel, self.iface_ct, iface.id, ipi.ip, ipi.network.prefixlen, parent)
+                except Exception as ex:
+                    self.logger.warning(f"Failed to process IP {cidr}: {ex}")
 
-            for vm in vms:
-                vmid = str(vm.get("vmid"))
-                name = vm.get("name")
-                status_str = vm.get("status")
-                vm_type = "lxc" if "type" in vm and vm["type"] == "lxc" else "qemu"
-                
-                if vmid_filter and str(vmid_filter) != vmid:
-                    continue
+    def sync_guests(self, reconciler, guests):
+        creates, updates, synced = [], [], []
+        for node_name, vm, iface_data in guests:
+            vmid = str(vm.get("vmid"))
+            name = vm.get("name")
+            if not name:
+                self.logger.warning(f"Skipping VMID {vmid} with no name")
+                continue
 
-                active_vm_names.add(name)
-                
-                nb_status = status_active if status_str == "running" else status_offline
-                
-                if not name:
-                    self.logger.warning(f"Skipping VMID {vmid} with no name")
-                    continue
+            # One malformed payload (e.g. maxmem None) must not take the rest of the run down with it
+            try:
+                fingerprint = vm_fingerprint(node_name, vm, iface_data)
+                vm_obj, changed, created = reconciler.diff(node_name, vm, fingerprint)
+            except Exception as e:
+                self.plan.record("virtualization.virtualmachine", "failed", name=name, vmid=vmid, error=str(e))
+                self.logger.error(f"Error syncing {name}: {e}")
+                continue
+            if changed is None:
+                continue
+            if created:
+                creates.append(vm_obj)
+            elif changed:
+                updates.append((vm_obj, changed))
+            synced.append((vm_obj, iface_data, fingerprint))
 
+            if created or changed:
+                if self.commit:
+                    action = "Created" if created else f"Updated ({', '.join(changed)})"
+                    self.logger.info(f"{action} VM: {name} (VMID: {vmid}, Node: {node_name})")
+                else:
+                    action = "create" if created else f"update ({', '.join(changed)})"
+                    self.logger.info(f"[Dry-Run] Would {action} VM: {name} (VMID: {vmid}, Node: {node_name})")
+
+        if not self.commit:
+            try:
+                self.sync_guest_interfaces([(vm_obj, iface_data) for vm_obj, iface_data, _ in synced])
+                self.flush_ip_links()
+            except Exception as ex:
+                self.ip_linker.reset()
+                self.logger.warning(f"Failed guest interface sync for {len(synced)} VMs: {ex}")
+            return
+
+        self.write_chunk(reconciler, creates, updates, synced)
+
+    def write_chunk(self, reconciler, creates, updates, synced):
+        """Write one chunk of guests in a single transaction.
+
+        The bulk path runs under a savepoint; if it fails, the chunk is replayed one VM per
+        savepoint so a bad guest only rolls back itself and the rest of the chunk commits.
+        """
+        try:
+            with transaction.atomic():
                 try:
-                    vm_obj, created = VirtualMachine.objects.get_or_create(
-                        name=name,
-                        cluster=cluster,
-                        defaults={
-                            "status": nb_status,
-                            "vcpus": vm.get("cpus", 1),
-                            "memory": int(vm.get("maxmem", 0) / 1024 / 1024),
-                            "disk": int(vm.get("maxdisk", 0) / 1024 / 1024 / 1024),
-                        }
+                    with transaction.atomic():
+                        self.write_guests(reconciler, creates, updates, synced)
+                except Exception as e:
+                    self.ip_linker.reset()
+                    self.logger.warning(f"Bulk write of {len(synced)} VMs failed ({e}); retrying each VM in its own savepoint")
+                    self.write_guests_individually(reconciler, creates, updates, synced)
+        except Exception as e:
+            self.tx_stats["rolled_back"] += 1
+            self.logger.error(f"Rolled back chunk of {len(synced)} VMs: {e}")
+            return
+        self.tx_stats["committed"] += 1
+
+    def write_guests_individually(self, reconciler, creates, updates, synced):
+        create_pks = {vm_obj.pk for vm_obj in creates}
+        changed = {vm_obj.pk: fields for vm_obj, fields in updates}
+        for vm_obj, iface_data, fingerprint in synced:
+            try:
+                with transaction.atomic():
+                    self.write_guests(
+                        reconciler,
+                        [vm_obj] if vm_obj.pk in create_pks else [],
+                        [(vm_obj, changed[vm_obj.pk])] if vm_obj.pk in changed else [],
+                        [(vm_obj, iface_data, fingerprint)],
+                    )
+            except Exception as e:
+                self.ip_linker.reset()
+                self.tx_stats["vms_rolled_back"] += 1
+                self.plan.record("virtualization.virtualmachine", "rolled_back", name=vm_obj.name, error=str(e))
+                self.logger.error(f"Rolled back VM {vm_obj.name}: {e}")
+
+    def write_guests(self, reconciler, creates, updates, synced):
+        reconciler.apply(creates, updates)
+        self.sync_guest_interfaces([(vm_obj, iface_data) for vm_obj, iface_data, _ in synced])
+        self.flush_ip_links()
+        # Fingerprints are stored in the same savepoint, so a rolled-back guest is retried next run
+        reconciler.stamp([(vm_obj, fingerprint) for vm_obj, _, fingerprint in synced])
+
+    def ensure_fingerprint_field(self):
+        try:
+            cf, _ = CustomField.objects.get_or_create(
+                key=FINGERPRINT_CF,
+                defaults={
+                    "label": "Proxmox Sync Hash",
+                    "type": CustomFieldTypeChoices.TYPE_TEXT,
+                    "description": "Fingerprint of the last synced Proxmox payload (managed by Sync Proxmox Inventory)",
+                    "advanced_ui": True,
+                },
+            )
+            cf.content_types.add(ContentType.objects.get_for_model(VirtualMachine))
+        except Exception as e:
+            self.logger.warning(f"Could not ensure custom field {FINGERPRINT_CF}; delta sync disabled: {e}")
+
+    def ensure_detail_fields(self):
+        fields = (
+            (CONFIG_DIGEST_CF, "Proxmox Config Digest", CustomFieldTypeChoices.TYPE_TEXT, "Digest of the guest config last parsed by the detail pass"),
+            (CONFIG_CF, "Proxmox Config", CustomFieldTypeChoices.TYPE_JSON, "Disks, NICs (model/bridge/VLAN) and CPU type from the guest config"),
+        )
+        for key, label, cf_type, description in fields:
+            try:
+                cf, _ = CustomField.objects.get_or_create(
+                    key=key,
+                    defaults={"label": label, "type": cf_type, "description": f"{description} (managed by Sync Proxmox Inventory)", "advanced_ui": True},
+                )
+                cf.content_types.add(ContentType.objects.get_for_model(VirtualMachine))
+            except Exception as e:
+                self.logger.warning(f"Could not ensure custom field {key}; detail pass will skip it: {e}")
+
+    def sync_guest_interfaces(self, synced):
+        # VM/LXC Interface & IP Sync (guest agent, LXC or ARP data fetched by the pipeline); pairs are left for flush_ip_links
+        reported = [(vm_obj, iface_data) for vm_obj, iface_data in synced if isinstance(iface_data, list)]
+        if not reported:
+            return
+
+        vm_ifaces, vm_macs = {}, {}
+        for i in VMInterface.objects.filter(virtual_machine_id__in=[vm_obj.pk for vm_obj, _ in reported]):
+            self.index_vm_iface(vm_ifaces, vm_macs, i)
+        new_ifaces, mac_updates = {}, {}
+        for vm_obj, iface_data in reported:
+            for iface in iface_data:
+                mac = iface_mac(iface)
+                vm_iface = self.match_vm_iface(vm_ifaces, vm_macs, vm_obj.pk, iface)
+                if vm_iface is None and (vm_obj.pk, iface_name(iface)) not in new_ifaces:
+                    vm_iface = new_ifaces[(vm_obj.pk, iface_name(iface))] = VMInterface(
+                        virtual_machine=vm_obj, name=iface_name(iface), mac_address=mac, status=self.status_active, enabled=True
                     )
+                    self.index_vm_iface(vm_ifaces, vm_macs, vm_iface)
+                    self.plan.record("virtualization.vminterface", "create", virtual_machine=vm_obj.name, name=vm_iface.name, mac_address=mac)
+                elif vm_iface is not None and mac and not iface_mac(vm_iface.mac_address):
+                    # Interfaces created before MACs were recorded get theirs, so a later ARP-named entry finds them
+                    vm_iface.mac_address = mac
+                    self.index_vm_iface(vm_ifaces, vm_macs, vm_iface)
+                    if (vm_iface.virtual_machine_id, vm_iface.name) not in new_ifaces:
+                        mac_updates[vm_iface.pk] = vm_iface
+                        self.plan.record("virtualization.vminterface", "update", virtual_machine=vm_obj.name, name=vm_iface.name, mac_address=mac)
+        if self.commit and mac_updates:
+            VMInterface.objects.bulk_update(mac_updates.values(), ["mac_address"], batch_size=self.ip_linker.batch_size)
+        if new_ifaces and self.commit:
+            VMInterface.objects.bulk_create(new_ifaces.values(), ignore_conflicts=True)
+            # With ignore_conflicts the in-memory pks may not be the stored ones: re-read
+            for i in VMInterface.objects.filter(virtual_machine_id__in={vm_pk for vm_pk, _ in new_ifaces}):
+                self.index_vm_iface(vm_ifaces, vm_macs, i)
 
-                    if commit:
-                        # Update fields
-                        if vm_obj.status != nb_status:
-                            vm_obj.status = nb_status
-
-                        # Update sizing fields on every sync
-                        new_vcpus = vm.get("cpus", vm_obj.vcpus)
-                        new_mem = int(vm.get("maxmem", 0) / 1024 / 1024) if vm.get("maxmem") else vm_obj.memory
-                        new_disk = int(vm.get("maxdisk", 0) / 1024 / 1024 / 1024) if vm.get("maxdisk") else vm_obj.disk
-
-                        if new_vcpus is not None and vm_obj.vcpus != new_vcpus:
-                            vm_obj.vcpus = new_vcpus
-                        if new_mem is not None and vm_obj.memory != new_mem:
-                            vm_obj.memory = new_mem
-                        if new_disk is not None and vm_obj.disk != new_disk:
-                            vm_obj.disk = new_disk
-                        
-                        # Update custom fields if they exist on the model
-                        cf_updates = {}
-                        if "proxmox_vmid" in vm_obj.custom_field_data:
-                            cf_updates["proxmox_vmid"] = vmid
-                        if "proxmox_node" in vm_obj.custom_field_data:
-                            cf_updates["proxmox_node"] = node_name
-                        if "proxmox_vmtype" in vm_obj.custom_field_data:
-                            cf_updates["proxmox_vmtype"] = vm_type
-                        
-                        if cf_updates:
-                            vm_obj.custom_field_data.update(cf_updates)
-                        
-                        vm_obj.save()
-                        
-                        action = "Created" if created else "Updated"
-                        self.logger.info(f"{action} VM: {name} (VMID: {vmid}, Node: {node_name})")
-
-                        # -------------------------------------------------
-                        # VM/LXC Interface & IP Sync (guest agent)
-                        # -------------------------------------------------
-                        try:
-                            iface_data = []
-                            if vm_type == "qemu":
-                                resp = requests.get(f"{prox_url}/api2/json/nodes/{node_name}/qemu/{vmid}/agent/network-get-interfaces", headers=headers, verify=verify_tls, timeout=10)
-                                if resp.status_code == 200:
-                                    payload = resp.json().get("data", {})
-                                    iface_data = payload.get("result", payload) if isinstance(payload, dict) else payload
-                            else:
-                                resp = requests.get(f"{prox_url}/api2/json/nodes/{node_name}/lxc/{vmid}/interfaces", headers=headers, verify=verify_tls, timeout=10)
-                                if resp.status_code == 200:
-                                    payload = resp.json().get("data", {})
-                                    iface_data = payload.get("result", payload) if isinstance(payload, dict) else payload
-
-                            if isinstance(iface_data, list):
-                                for iface in iface_data:
-                                    iface_name = iface.get("name") or iface.get("iface") or "eth0"
-                                    vm_iface, _ = VMInterface.objects.get_or_create(
-                                        virtual_machine=vm_obj,
-                                        name=iface_name,
-                                        defaults={"status": status_active, "enabled": True},
-                                    )
-                                    for ip_addr, prefix in parse_ip_addresses(iface.get("ip-addresses", [])):
-                                        if not Prefix.objects.filter(network__net_contains_or_equals=ip_addr).exists():
-                                            self.logger.info(f"Skipping IP {ip_addr}/{prefix}: no parent Prefix")
-                                        else:
-                                            ip_obj, _ = IPAddress.objects.get_or_create(
-                                                host=ip_addr,
-                                                mask_length=prefix,
-                                                defaults={"status": status_active}
-                                            )
-                                            RelationshipAssociation.objects.get_or_create(
-                                                relationship=vm_iface_rel,
-                                                source_type=vm_iface_ct,
-                                                source_id=vm_iface.id,
-                                                destination_type=ip_ct,
-                                                destination_id=ip_obj.id,
-                                            )
-                        except Exception as ex:
-                            self.logger.warning(f"Failed guest IP sync for {name}: {ex}")
+        for vm_obj, iface_data in reported:
+            for iface in iface_data:
+                vm_iface = self.match_vm_iface(vm_ifaces, vm_macs, vm_obj.pk, iface)
+                if vm_iface is None:
+                    continue
+                for ip_addr, prefix in guest_ips(iface):
+                    parent = self.prefix_index.lookup(ip_addr)
+                    if parent is None:
+                        self.logger.info(f"Skipping IP {ip_addr}/{prefix}: no parent Prefix")
                     else:
-                        self.logger.info(f"[Dry-Run] Would sync VM: {name} (VMID: {vmid}, Node: {node_name})")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error syncing {name}: {e}")
+                        if iface.get("source") == "arp":
+                            # ARP knows no mask; the address takes the length of the prefix it lives in
+                            prefix = parent.prefix_length
+                        self.ip_linker.add(self.vm_iface_rel, self.vm_iface_ct, vm_iface.id, ip_addr, prefix, parent)
 
-        # Stale marking
-        if mark_stale and commit:
-            all_vms = VirtualMachine.objects.filter(cluster=cluster)
-            tag_name = "orphaned-from-proxmox"
+    def index_vm_iface(self, vm_ifaces, vm_macs, vm_iface):
+        vm_ifaces[(vm_iface.virtual_machine_id, vm_iface.name)] = vm_iface
+        mac = iface_mac(vm_iface.mac_address)
+        if mac:
+            same_mac = vm_macs.setdefault((vm_iface.virtual_machine_id, mac), {})
+            same_mac[vm_iface.name] = vm_iface
+
+    def match_vm_iface(self, vm_ifaces, vm_macs, vm_pk, iface):
+        """The VMInterface an interface entry belongs to, or None.
+
+        A NIC is named by the guest when the agent reports it (ens18) but by its config slot
+        when it comes from ARP data (net0), so a VM's only interface with the entry's MAC wins
+        over a name match with a different MAC. MACs shared inside the guest (VLAN
+        subinterfaces, bonds, bridges) are left to the name.
+        """
+        mac = iface_mac(iface)
+        named = vm_ifaces.get((vm_pk, iface_name(iface)))
+        if named is not None and (mac is None or iface_mac(named.mac_address) in (None, mac)):
+            return named
+        same_mac = vm_macs.get((vm_pk, mac), {}) if mac else {}
+        if len(same_mac) == 1:
+            return next(iter(same_mac.values()))
+        return named
+
+    def flush_ip_links(self):
+        ips_created, links_created, skipped = self.ip_linker.flush()
+        if ips_created or links_created or skipped:
+            prefix = "IP sync" if self.commit else "[Dry-Run] IP sync would make"
+            self.logger.info(f"{prefix}: {ips_created} IPs created, {links_created} interface links added, {skipped} skipped (mask conflict)")
+
+
+class SyncProxmoxNode(SyncProxmoxInventory):
+    shard_node = StringVar(description="Proxmox node handled by this shard")
+    batch_id = StringVar(description="Shard batch identifier set by the dispatching job")
+
+    class Meta:
+        name = "Sync Proxmox Inventory (Node Shard)"
+        description = "Per-node shard dispatched by Sync Proxmox Inventory in sharded mode"
+        has_sensitive_variables = True
+        hidden = True
+
+    def run(self, shard_node="", batch_id="", proxmox_url="", proxmox_user="", proxmox_token="", commit=False, api_retries=3, **options):
+        with instrumented(self):
+            creds = self.credentials(proxmox_url, proxmox_user, proxmox_token)
+            if creds is None:
+                self.report_shard(batch_id, shard_node, False, "missing Proxmox credentials")
+                return
+
+            ok, error = False, ""
+            options.pop("sharded", None)
+            options.update(node_filter="", mark_stale=False, use_cluster_resources=False)
             try:
-                 tag, _ = Tag.objects.get_or_create(name=tag_name, defaults={"color": "ff0000"})
-            except: 
-                 tag = None
-
-            for vm in all_vms:
-                if vm.name not in active_vm_names:
-                    if vm.status != status_stale:
-                        if tag:
-                            vm.tags.add(tag)
-                        # Optional: vm.status = status_stale
-                        vm.save()
-                        self.logger.warning(f"Marked stale: {vm.name}")
-
-register_jobs(SyncProxmoxInventory)
+                ok = self.execute(creds, commit, api_retries, only_node=shard_node, **options)
+                if not ok:
+                    error = "node sync incomplete, see shard log"
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                # Report even on failure so the batch can complete its fan-in without this node
+                self.report_shard(batch_id, shard_node, ok, error)
+            return self.report_plan(proxmox_url=creds[0], shard_node=shard_node, batch_id=batch_id)
+
+
+class SyncProxmoxShardDeadline(SyncProxmoxInventory):
+    batch_id = StringVar(description="Shard batch identifier set by the dispatching job")
+
+    class Meta:
+        name = "Sync Proxmox Inventory (Shard Deadline)"
+        description = "Completes a shard batch whose shards did not all report in time, counting the missing ones as failed"
+        has_sensitive_variables = True
+        hidden = True
+
+    def run(self, batch_id="", **options):
+        with instrumented(self):
+            # Missing shards make the fan-in skip stale marking, so this job never needs the sync setup
+            self.complete_batch(batch_id)
+
+
+register_jobs(SyncProxmoxInventory, SyncProxmoxNode, SyncProxmoxShardDeadline)
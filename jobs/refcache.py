@@ -0,0 +1,107 @@
+"""Cross-run cache of reference objects (Status, Cluster, Relationship, Tag, ...), kept in the Django cache.
+
+Every job run starts by resolving the same handful of rows. Nautobot re-imports this
+package before each run, so nothing held in a module global here outlives a run; the
+resolved instances are stored (pickled) in the Django cache instead, where they are
+shared by every run and worker process for up to ``max_age`` seconds.
+
+Each model has a version counter in the cache, and entry keys include it. A
+``post_save`` or ``post_delete`` for the model in any process that has imported these
+jobs bumps the counter, which orphans every entry for that model at once. Changes made
+where the jobs aren't loaded (e.g. a web process that hasn't listed jobs) don't signal,
+so ``max_age`` bounds how stale an entry can get.
+
+Every ``get`` returns a fresh unpickled copy; ContentType lookups need no entry here,
+``get_for_model`` is already cached by Django.
+"""
+import hashlib
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+
+class RefCache:
+    def __init__(self, backend=None, max_age=600, prefix="jobs.refcache"):
+        self.backend = backend if backend is not None else cache
+        self.max_age = max_age
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._models = set()
+        self._lock = threading.Lock()
+
+    def get(self, model, **lookup):
+        """Return the object matching ``lookup``, or None if it doesn't exist (misses are not cached)."""
+        key = self._key(model, lookup)
+        obj = self._cached(key)
+        if obj is not None:
+            return obj
+        obj = model.objects.filter(**lookup).first()
+        if obj is not None:
+            self._store(key, obj)
+        return obj
+
+    def get_or_create(self, model, defaults=None, **lookup):
+        key = self._key(model, lookup)
+        obj = self._cached(key)
+        if obj is not None:
+            return obj, False
+        obj, created = model.objects.get_or_create(**lookup, defaults=defaults or {})
+        # A row created inside a transaction only becomes shareable once that transaction commits
+        transaction.on_commit(lambda: self._store(key, obj))
+        return obj, created
+
+    def clear(self, model):
+        """Drop every entry for ``model`` (in all processes) by bumping its version."""
+        version_key = self._version_key(model._meta.label_lower)
+        try:
+            self.backend.incr(version_key)
+        except ValueError:
+            # No version yet: nothing can be cached under it either
+            self.backend.add(version_key, 1, timeout=None)
+
+    def _version_key(self, label):
+        return f"{self.prefix}:{label}:version"
+
+    def _key(self, model, lookup):
+        self._watch(model)
+        label = model._meta.label_lower
+        version = self.backend.get(self._version_key(label))
+        if version is None:
+            self.backend.add(self._version_key(label), 1, timeout=None)
+            version = self.backend.get(self._version_key(label), 1)
+        items = repr(tuple(sorted((k, str(getattr(v, "pk", v))) for k, v in lookup.items())))
+        return f"{self.prefix}:{label}:{version}:{hashlib.sha1(items.encode()).hexdigest()}"
+
+    def _cached(self, key):
+        obj = self.backend.get(key)
+        with self._lock:
+            if obj is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return obj
+
+    def _store(self, key, obj):
+        self.backend.set(key, obj, timeout=self.max_age)
+
+    def _watch(self, model):
+        if model in self._models:
+            return
+        with self._lock:
+            if model in self._models:
+                return
+            self._models.add(model)
+        # Weak, per-instance receivers: the instance created by the next re-import connects its own
+        uid = f"jobs.refcache:{id(self)}:{model._meta.label_lower}"
+        post_save.connect(self._invalidate, sender=model, dispatch_uid=f"{uid}:save")
+        post_delete.connect(self._invalidate, sender=model, dispatch_uid=f"{uid}:delete")
+
+    def _invalidate(self, sender, **kwargs):
+        self.clear(sender)
+
+
+# Shared by every job in this package; entries live in the Django cache, not in this object
+ref_cache = RefCache()
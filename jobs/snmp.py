@@ -0,0 +1,173 @@
+"""Concurrent SNMP table collection for the discovery jobs.
+
+Walks are run with net-snmp's ``snmpbulkwalk`` (GETBULK, ``-Cr<max_repetitions>`` rows
+per PDU instead of one GETNEXT round trip per row), several devices/tables at a time on
+a thread pool. Each walk is its own subprocess, so threads only wait on pipes.
+Output is parsed line by line into typed ``(index, value)`` rows while the walk is still
+running, so callers can reduce a table without holding its full text or dict in memory.
+
+Targets may name a port, which is how the engine is pointed at a local simulator
+(e.g. ``snmpsim-command-responder --agent-udpv4-endpoint=127.0.0.1:1161``).
+"""
+import io
+import re
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+SNMPTarget = namedtuple("SNMPTarget", "host community port", defaults=(161,))
+
+ARP_OID = ".1.3.6.1.2.1.4.22.1.2"  # ipNetToMediaPhysAddress
+
+_INT_TYPES = {"INTEGER", "Gauge32", "Counter32", "Counter64", "Unsigned32", "Integer32"}
+
+
+class SNMPError(Exception):
+    pass
+
+
+def parse_value(raw):
+    """Convert net-snmp's ``TYPE: value`` display into int, bytes or str (None for no value)."""
+    type_name, sep, value = raw.partition(": ")
+    if not sep:
+        # e.g. '""' for an empty string, or "No Such Instance currently exists at this OID"
+        return raw.strip('"') or None if raw.startswith('"') else None
+    if type_name in _INT_TYPES:
+        # Enumerations display as "up(1)"
+        if value.endswith(")") and "(" in value:
+            value = value[value.rindex("(") + 1:-1]
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if type_name == "Timeticks":
+        return int(value[1:value.index(")")]) if value.startswith("(") else value
+    if type_name == "Hex-STRING":
+        return bytes.fromhex(value.replace(" ", ""))
+    if type_name == "STRING":
+        return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+    return value
+
+
+def format_mac(raw):
+    """Normalize a MAC (raw octets or any separator style) to upper-case colon notation."""
+    if isinstance(raw, bytes):
+        # Hex-STRING values arrive as raw octets
+        return ":".join(f"{b:02X}" for b in raw) if len(raw) == 6 else raw.hex().upper()
+    parts = re.split(r'[:\-\s]', raw.strip())
+    if len(parts) == 6:
+        return ":".join([f"{int(p, 16):02X}" for p in parts if p]).upper()
+    return raw.upper()
+
+
+def reduce_arp(rows):
+    """ipNetToMediaPhysAddress rows (index ifIndex.a.b.c.d) -> {ip: MAC}."""
+    arp = {}
+    for index, value in rows:
+        ip = ".".join(index.split(".")[-4:])
+        try: arp[ip] = format_mac(value)
+        except Exception: pass
+    return arp
+
+
+def parse_rows(lines, oid):
+    """Yield ``(index_suffix, value)`` from ``snmpwalk -On`` output text lines as they arrive.
+
+    Long values wrap onto continuation lines, so each row is held until the next one
+    starts; memory stays bounded by a single row.
+    """
+    prefix = oid if oid.startswith(".") else f".{oid}"
+    cut = len(prefix) + 1
+    key = raw = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        name, sep, value = line.partition(" = ")
+        if sep and name[:1] == ".":
+            if key is not None:
+                yield key, parse_value(raw)
+            raw = value
+            key = name[cut:] if name.startswith(prefix) else name.lstrip(".")
+        elif key is not None and line:
+            raw = f"{raw} {line.strip()}"
+    if key is not None:
+        yield key, parse_value(raw)
+
+
+def stream_command(cmd, oid, timeout=None):
+    """Run ``cmd`` and yield parsed rows from its stdout; raises SNMPError if it fails."""
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError as e:
+        raise SNMPError(f"{cmd[0]} not installed on this worker") from e
+    try:
+        yield from parse_rows(io.TextIOWrapper(proc.stdout, errors="replace"), oid)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            raise SNMPError(f"walk of {oid} timed out") from e
+        if proc.returncode:
+            stderr = proc.stderr.read().decode(errors="replace").strip()
+            raise SNMPError(stderr or f"exit status {proc.returncode}")
+    finally:
+        # Also reached when the consumer stops early
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+class SNMPEngine:
+    def __init__(self, max_workers=8, max_repetitions=25, timeout=5, retries=1, command="snmpbulkwalk", observer=None):
+        self.max_workers = max_workers
+        self.max_repetitions = max_repetitions
+        self.timeout = timeout
+        self.retries = retries
+        self.command = command
+        # Optional callback(kind, endpoint, elapsed, failed), e.g. Instrumentation.record_call
+        self.observer = observer
+
+    def command_line(self, target, oid):
+        agent = target.host if target.port == 161 else f"udp:{target.host}:{target.port}"
+        return [
+            self.command, "-v2c", "-On", f"-Cr{self.max_repetitions}",
+            "-t", str(self.timeout), "-r", str(self.retries),
+            "-c", target.community, agent, oid,
+        ]
+
+    def stream(self, target, oid):
+        """Yield typed ``(index_suffix, value)`` rows under ``oid`` while the walk runs."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield from stream_command(self.command_line(target, oid), oid, timeout=self.timeout * (self.retries + 1) + 30)
+            failed = False
+        finally:
+            if self.observer is not None:
+                self.observer("snmp", f"{target.host} {oid}", time.perf_counter() - start, failed)
+
+    def walk_many(self, requests, handler=None):
+        """Walk ``[(target, oid), ...]`` concurrently.
+
+        ``handler(key, rows)`` consumes one walk's row iterator on its worker thread and
+        returns that walk's result (default: ``dict(rows)``), so large tables can be
+        reduced while they stream in. Returns ``(results, errors)``, both keyed by
+        ``(target.host, oid)``; a failing walk doesn't affect the others.
+        """
+        handler = handler or (lambda key, rows: dict(rows))
+        results, errors = {}, {}
+        if not requests:
+            return results, errors
+
+        def run(target, oid):
+            return handler((target.host, oid), self.stream(target, oid))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(requests))), thread_name_prefix="snmp-walk") as pool:
+            futures = {pool.submit(run, target, oid): (target.host, oid) for target, oid in requests}
+            for future, key in futures.items():
+                try:
+                    results[key] = future.result()
+                except SNMPError as e:
+                    errors[key] = str(e)
+        return results, errors
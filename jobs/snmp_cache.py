@@ -0,0 +1,44 @@
+"""TTL cache and run-to-run snapshots of reduced SNMP tables, kept in the Django cache.
+
+``fresh()`` answers a walk from a table collected less than ``ttl`` seconds ago, so
+frequent scheduled runs don't touch the devices at all. Snapshots are the tables the
+last successful run reconciled against; ``diff_tables`` against them yields the keys
+(MACs, IPs) that appeared, vanished or changed, and only those need reconciling.
+"""
+import time
+
+
+def diff_tables(old, new):
+    """Return ``(added, removed, changed)`` key sets between two ``{key: value}`` tables."""
+    old_keys, new_keys = old.keys(), new.keys()
+    changed = {k for k in old_keys & new_keys if old[k] != new[k]}
+    return new_keys - old_keys, old_keys - new_keys, changed
+
+
+class TableCache:
+    def __init__(self, backend, ttl, prefix="discovery:snmp"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def fresh(self, host, oid):
+        """The cached table for ``(host, oid)`` if it is younger than the TTL, else None."""
+        entry = self.backend.get(f"{self.prefix}:table:{host}:{oid}") if self.ttl > 0 else None
+        if entry is not None and time.time() - entry["at"] < self.ttl:
+            self.hits += 1
+            return entry["table"]
+        self.misses += 1
+        return None
+
+    def store(self, host, oid, table):
+        if self.ttl > 0:
+            self.backend.set(f"{self.prefix}:table:{host}:{oid}", {"at": time.time(), "table": table}, timeout=self.ttl)
+
+    def snapshot(self, name):
+        """The table saved by the last successful run under ``name``, or None."""
+        return self.backend.get(f"{self.prefix}:snapshot:{name}")
+
+    def save_snapshot(self, name, table):
+        self.backend.set(f"{self.prefix}:snapshot:{name}", table, timeout=None)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The job modules under test are imported directly, as the benchmarks do, so no Nautobot is needed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "jobs"))
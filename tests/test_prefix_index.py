@@ -0,0 +1,35 @@
+from collections import namedtuple
+
+from prefix_index import PrefixIndex
+
+Prefix = namedtuple("Prefix", "network prefix_length")
+
+
+def test_lookup_returns_most_specific_prefix():
+    index = PrefixIndex([Prefix("10.0.0.0", 8), Prefix("10.1.0.0", 16), Prefix("10.1.2.0", 24), Prefix("2001:db8::", 32)])
+    assert index.lookup("10.1.2.3") == Prefix("10.1.2.0", 24)
+    assert index.lookup("10.1.3.3") == Prefix("10.1.0.0", 16)
+    assert index.lookup("10.200.0.1") == Prefix("10.0.0.0", 8)
+    assert index.lookup("2001:db8::10") == Prefix("2001:db8::", 32)
+    assert len(index) == 4
+
+
+def test_lookup_misses():
+    index = PrefixIndex([Prefix("10.1.2.0", 24)])
+    assert index.lookup("192.168.1.1") is None
+    assert index.lookup("2001:db8::1") is None
+    assert index.lookup("not-an-ip") is None
+    assert "192.168.1.1" not in index
+
+
+def test_lookup_accepts_interface_notation_and_host_bits_in_network():
+    # A Prefix stored with host bits set still indexes its network address
+    index = PrefixIndex([Prefix("172.16.110.7", 24)])
+    assert index.lookup("172.16.110.101/24") == Prefix("172.16.110.7", 24)
+    assert "172.16.110.1" in index
+
+
+def test_add_replaces_duplicate_network():
+    index = PrefixIndex([Prefix("10.1.2.0", 24)])
+    index.add(Prefix("10.1.2.0", 24))
+    assert len(index) == 1
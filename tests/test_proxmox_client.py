@@ -0,0 +1,116 @@
+import pytest
+import requests
+
+from proxmox_client import AdaptiveLimit, CircuitOpenError, NodeBreaker, ProxmoxClient, endpoint_key
+
+
+def test_endpoint_key_collapses_nodes_and_vmids():
+    assert endpoint_key("/nodes/pve1/qemu/101/agent/network-get-interfaces") == "/nodes/{node}/qemu/{vmid}/agent/network-get-interfaces"
+    assert endpoint_key("/nodes/pve2/lxc/200/config?current=1") == "/nodes/{node}/lxc/{vmid}/config"
+    assert endpoint_key("/cluster/resources") == "/cluster/resources"
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = NodeBreaker(threshold=2, cooldown=30)
+    assert breaker.allow() == (True, None)
+    assert breaker.failure() is None
+    assert breaker.failure().startswith("open after 2 consecutive failures")
+    assert breaker.allow() == (False, None)
+
+    breaker.opened_at -= 31
+    assert breaker.allow() == (True, "half-open: probing")
+    # Only one probe at a time, and calls that don't report back never take it
+    assert breaker.allow() == (False, None)
+    assert breaker.allow(probe=False) == (False, None)
+    assert breaker.success() == "closed: node answering again"
+    assert breaker.allow(probe=False) == (True, None)
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = NodeBreaker(threshold=1, cooldown=30)
+    breaker.failure()
+    breaker.opened_at -= 31
+    assert breaker.allow() == (True, "half-open: probing")
+    assert breaker.failure().startswith("open")
+    assert breaker.allow() == (False, None)
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = NodeBreaker(threshold=2, cooldown=30)
+    breaker.failure()
+    assert breaker.success() is None
+    assert breaker.failure() is None
+    assert breaker.state == "closed"
+
+
+def test_adaptive_limit_halves_then_grows_back():
+    limit = AdaptiveLimit(maximum=8, slow_call=2.0)
+    assert limit.feedback(0.1, ok=False) == (8, 4)
+    # At most one cut per second
+    assert limit.feedback(0.1, ok=False) is None
+    limit._last_decrease -= 1.0
+    assert limit.feedback(5.0, ok=True) == (4, 2)
+    for _ in range(2):
+        assert limit.feedback(0.1, ok=True) is None
+    assert limit.limit == 3
+    for _ in range(3 + 4):
+        limit.feedback(0.1, ok=True)
+    assert limit.limit == 5
+
+
+def test_adaptive_limit_bounds():
+    limit = AdaptiveLimit(maximum=1, slow_call=2.0)
+    assert limit.feedback(0.1, ok=False) is None
+    for _ in range(5):
+        limit.feedback(0.1, ok=True)
+    assert limit.limit == 1
+
+
+class TimeoutSession:
+    """Replaces the client's HTTP session; every request times out."""
+
+    def __init__(self):
+        self.paths = []
+
+    def get(self, url, params=None, timeout=None):
+        self.paths.append(url.split("/api2/json", 1)[1])
+        raise requests.Timeout("read timed out")
+
+    def close(self):
+        pass
+
+
+def client_with_timeouts(**kwargs):
+    client = ProxmoxClient("https://pve.example:8006", "sync@pve!token", "secret", retries=0, node_concurrency=4, breaker_threshold=3, **kwargs)
+    client.session = TimeoutSession()
+    return client
+
+
+def test_agent_timeouts_do_not_count_against_the_node():
+    client = client_with_timeouts()
+    for vmid in range(100, 110):
+        with pytest.raises(requests.Timeout):
+            client.get(f"/nodes/pve1/qemu/{vmid}/agent/network-get-interfaces")
+    assert client.open_circuits() == []
+    assert client.node_limit("pve1") == 4
+    assert client.drain_events() == []
+
+
+def test_node_timeouts_open_the_breaker_and_cut_concurrency():
+    calls = []
+    client = client_with_timeouts(observer=lambda *call: calls.append(call))
+    for _ in range(3):
+        with pytest.raises(requests.Timeout):
+            client.get("/nodes/pve1/qemu/101/config")
+    assert client.open_circuits() == ["pve1"]
+    assert client.node_limit("pve1") == 2
+    with pytest.raises(CircuitOpenError):
+        client.get("/nodes/pve1/qemu/102/config")
+    # Agent calls fail fast too while the node is open
+    with pytest.raises(CircuitOpenError):
+        client.get("/nodes/pve1/qemu/102/agent/network-get-interfaces")
+    assert len(client.session.paths) == 3
+    assert [(kind, endpoint, failed) for kind, endpoint, _, failed in calls] == [("http", "/nodes/{node}/qemu/{vmid}/config", True)] * 3
+    messages = [message for node, message in client.drain_events()]
+    assert any(m.startswith("circuit open") for m in messages)
+    assert "concurrency 4 -> 2 after failure" in messages
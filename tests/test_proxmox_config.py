@@ -0,0 +1,64 @@
+from proxmox_config import agent_enabled, config_options, guest_details
+
+QEMU_CONFIG = {
+    "cpu": "cputype=host,flags=+aes",
+    "cores": 4,
+    "sockets": 1,
+    "scsi0": "local-lvm:vm-101-disk-0,iothread=1,size=32G",
+    "ide2": "local:iso/debian.iso,media=cdrom,size=600M",
+    "efidisk0": "local-lvm:vm-101-disk-1,efitype=4m,size=4M",
+    "net0": "virtio=bc:24:11:00:00:01,bridge=vmbr0,tag=20",
+    "net1": "model=e1000,macaddr=BC:24:11:00:00:02,bridge=vmbr1,trunks=10;20",
+    "digest": "0123abcd",
+}
+
+LXC_CONFIG = {
+    "arch": "amd64",
+    "cores": 2,
+    "rootfs": "local-lvm:vm-200-disk-0,size=8G",
+    "mp0": "/mnt/data,mp=/data,size=100G",
+    "net0": "name=eth0,bridge=vmbr0,hwaddr=BC:24:11:AA:BB:CC,ip=dhcp,type=veth",
+}
+
+
+def test_config_options():
+    assert config_options("virtio=BC:24:11:00:00:01,bridge=vmbr0,tag=20") == {"virtio": "BC:24:11:00:00:01", "bridge": "vmbr0", "tag": "20"}
+    assert config_options("") == {}
+
+
+def test_guest_details_qemu():
+    details = guest_details(QEMU_CONFIG, "qemu")
+    assert details["cpu"] == "host"
+    assert (details["cores"], details["sockets"]) == (4, 1)
+    assert [(d["slot"], d["size"]) for d in details["disks"]] == [("efidisk0", "4M"), ("scsi0", "32G")]
+    assert details["nics"] == [
+        {"slot": "net0", "name": "net0", "model": "virtio", "mac": "BC:24:11:00:00:01", "bridge": "vmbr0", "vlan": 20, "trunks": None},
+        {"slot": "net1", "name": "net1", "model": "e1000", "mac": "BC:24:11:00:00:02", "bridge": "vmbr1", "vlan": None, "trunks": "10;20"},
+    ]
+
+
+def test_guest_details_qemu_cpu_forms():
+    assert guest_details({"cpu": "x86-64-v2-AES"}, "qemu")["cpu"] == "x86-64-v2-AES"
+    assert guest_details({"cpu": "kvm64,flags=+aes"}, "qemu")["cpu"] == "kvm64"
+    assert guest_details({}, "qemu")["cpu"] == "default"
+
+
+def test_guest_details_lxc():
+    details = guest_details(LXC_CONFIG, "lxc")
+    assert details["cpu"] == "amd64"
+    assert [d["slot"] for d in details["disks"]] == ["mp0", "rootfs"]
+    assert details["nics"] == [
+        {"slot": "net0", "name": "eth0", "model": "veth", "mac": "BC:24:11:AA:BB:CC", "bridge": "vmbr0", "vlan": None, "trunks": None},
+    ]
+
+
+def test_agent_enabled():
+    assert agent_enabled("1")
+    assert agent_enabled(1)
+    assert agent_enabled("enabled=1,fstrim_cloned_disks=1")
+    assert agent_enabled("1,fstrim_cloned_disks=1")
+    assert not agent_enabled("0")
+    assert not agent_enabled("fstrim_cloned_disks=1,enabled=0")
+    assert not agent_enabled("fstrim_cloned_disks=1")
+    assert not agent_enabled(None)
+    assert not agent_enabled("")
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from proxmox_pipeline import FetchPipeline, NegativeCache
+
+
+class Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+
+    def task(self, pipeline, node, seconds=0.02):
+        with self.lock:
+            self.running[node] = self.running.get(node, 0) + 1
+            self.peak[node] = max(self.peak.get(node, 0), self.running[node])
+            self.peak["all"] = max(self.peak.get("all", 0), sum(self.running.values()))
+        time.sleep(seconds)
+        with self.lock:
+            self.running[node] -= 1
+        pipeline.emit("done", node, None)
+
+
+def test_waiting_tasks_do_not_hold_workers_from_other_nodes():
+    pipeline = FetchPipeline(max_workers=8, node_concurrency=4)
+    seen = Concurrency()
+    for node in ("pve1", "pve2"):
+        for _ in range(16):
+            pipeline.submit(node, seen.task, pipeline, node)
+    assert sum(1 for _ in pipeline.messages()) == 32
+    assert seen.peak["pve1"] == seen.peak["pve2"] == 4
+    assert seen.peak["all"] == 8
+
+
+def test_node_limit_throttles_only_its_node():
+    limits = {"slow": 1}
+    pipeline = FetchPipeline(max_workers=4, node_concurrency=4, node_limit=limits.get)
+    seen = Concurrency()
+    for _ in range(4):
+        pipeline.submit("slow", seen.task, pipeline, "slow", 0.05)
+    for _ in range(12):
+        pipeline.submit("fast", seen.task, pipeline, "fast")
+    nodes = [node for _, node, _ in pipeline.messages()]
+    assert len(nodes) == 16
+    assert seen.peak["slow"] == 1
+    assert seen.peak["fast"] >= 3
+    # The slow node's queued tasks never sit on a worker, so the fast node finishes first
+    assert max(i for i, node in enumerate(nodes) if node == "fast") < max(i for i, node in enumerate(nodes) if node == "slow")
+
+
+def test_follow_up_tasks_and_errors():
+    pipeline = FetchPipeline(max_workers=2, node_concurrency=1)
+
+    def child(i):
+        if i == 2:
+            raise ValueError("agent exploded")
+        pipeline.emit("guest", "pve1", i)
+
+    def listing():
+        for i in range(4):
+            pipeline.submit("pve1", child, i)
+
+    pipeline.submit("pve1", listing)
+    messages = list(pipeline.messages())
+    assert sorted(payload for kind, _, payload in messages if kind == "guest") == [0, 1, 3]
+    assert [payload for kind, _, payload in messages if kind == "error"] == ["child failed for pve1: agent exploded"]
+
+
+class DictCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+
+def test_negative_cache_merges_concurrent_saves():
+    backend = DictCache()
+    first, second = NegativeCache(backend, "agents", 60), NegativeCache(backend, "agents", 60)
+    first.add(101)
+    second.add(102)
+    first.save()
+    second.save()
+    reloaded = NegativeCache(backend, "agents", 60)
+    assert 101 in reloaded and 102 in reloaded and 103 not in reloaded
+    assert (reloaded.hits, reloaded.misses) == (2, 1)
+
+
+def test_negative_cache_disabled_with_zero_ttl():
+    backend = DictCache()
+    cache = NegativeCache(backend, "agents", 0)
+    cache.add(101)
+    cache.save()
+    assert 101 not in cache
+    assert backend.data == {}
@@ -0,0 +1,65 @@
+from proxmox_tasks import TaskWatermark, guest_vmid
+
+
+class DictCache:
+    """The slice of the Django cache API TaskWatermark uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+
+def task(upid, task_type, vmid, start, end=None):
+    return {"upid": upid, "type": task_type, "id": str(vmid), "starttime": start, "endtime": end}
+
+
+def test_guest_vmid():
+    assert guest_vmid(task("a", "qmstart", 101, 0)) == 101
+    assert guest_vmid(task("b", "vzcreate", 200, 0)) == 200
+    assert guest_vmid(task("c", "vzdump", 101, 0)) is None
+    assert guest_vmid(task("d", "srvreload", "networking", 0)) is None
+    assert guest_vmid(task("e", "aptupdate", "", 0)) is None
+
+
+def test_first_run_collects_everything_and_needs_a_full_sync():
+    mark = TaskWatermark(DictCache(), "wm")
+    assert mark.full_due(3600)
+    touched, oldest = mark.collect([task("a", "qmstart", 101, 100, 101), task("b", "qmmigrate", 101, 150, 160), task("c", "vzdump", 102, 90, 95)])
+    assert touched == {101: {"qmstart", "qmmigrate"}}
+    assert oldest == 90
+
+
+def test_advance_skips_tasks_already_seen_at_the_mark():
+    backend = DictCache()
+    mark = TaskWatermark(backend, "wm")
+    seen = [task("a", "qmstart", 101, 100, 101), task("b", "qmstop", 102, 200, 201)]
+    mark.advance(seen, full=True)
+    assert (mark.since, mark.upids) == (200, {"b"})
+    mark.save()
+
+    mark = TaskWatermark(backend, "wm")
+    assert not mark.full_due(3600)
+    touched, _ = mark.collect(seen + [task("c", "qmreboot", 103, 200, 202), task("d", "qmstart", 104, 250, 251)])
+    assert touched == {103: {"qmreboot"}, 104: {"qmstart"}}
+
+
+def test_advance_stops_at_a_running_task():
+    mark = TaskWatermark(DictCache(), "wm")
+    tasks = [task("a", "qmstart", 101, 100, 101), task("b", "qmclone", 102, 150), task("c", "qmstop", 103, 200, 201)]
+    mark.advance(tasks)
+    # The running clone is left out of the seen set so it is collected again once it ends
+    assert (mark.since, mark.upids) == (150, set())
+    touched, _ = mark.collect(tasks[1:])
+    assert touched == {102: {"qmclone"}, 103: {"qmstop"}}
+
+
+def test_advance_never_moves_backwards():
+    mark = TaskWatermark(DictCache(), "wm")
+    mark.advance([task("a", "qmstart", 101, 300, 301)])
+    mark.advance([task("b", "qmstart", 102, 200, 201)])
+    assert (mark.since, mark.upids) == (300, {"a"})
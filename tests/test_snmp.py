@@ -0,0 +1,108 @@
+import stat
+
+import pytest
+
+from snmp import SNMPEngine, SNMPError, SNMPTarget, format_mac, parse_rows, parse_value, stream_command
+
+IFTABLE_OID = ".1.3.6.1.2.1.2.2.1"
+
+# snmpbulkwalk -On output as net-snmp prints it, including a Hex-STRING wrapped after 16 octets
+WALK = f"""{IFTABLE_OID}.2.1 = STRING: "lo"
+{IFTABLE_OID}.2.2 = STRING: "sfp-sfpplus1"
+{IFTABLE_OID}.3.2 = INTEGER: ethernetCsmacd(6)
+{IFTABLE_OID}.6.2 = Hex-STRING: 00 1A 2B 3C 4D 5E 00 1A 2B 3C 4D 5E 00 1A 2B 3C 
+4D 5E 
+{IFTABLE_OID}.6.3 = ""
+{IFTABLE_OID}.8.2 = INTEGER: up(1)
+{IFTABLE_OID}.9.2 = Timeticks: (12345) 0:02:03.45
+"""
+
+
+def test_parse_value_types():
+    assert parse_value("INTEGER: up(1)") == 1
+    assert parse_value("Gauge32: 1000000000") == 1000000000
+    assert parse_value('STRING: "ether1"') == "ether1"
+    assert parse_value('STRING: ""') == ""
+    assert parse_value('""') is None
+    assert parse_value("Timeticks: (12345) 0:02:03.45") == 12345
+    assert parse_value("Hex-STRING: BC 24 11 00 00 01") == bytes.fromhex("BC2411000001")
+    assert parse_value("No Such Instance currently exists at this OID") is None
+
+
+def test_parse_rows_joins_wrapped_values():
+    rows = list(parse_rows(WALK.splitlines(keepends=True), IFTABLE_OID))
+    assert rows == [
+        ("2.1", "lo"),
+        ("2.2", "sfp-sfpplus1"),
+        ("3.2", 6),
+        ("6.2", bytes.fromhex("001A2B3C4D5E" * 3)),
+        ("6.3", None),
+        ("8.2", 1),
+        ("9.2", 12345),
+    ]
+
+
+def test_parse_rows_accepts_oid_without_leading_dot():
+    rows = dict(parse_rows([f"{IFTABLE_OID}.2.1 = STRING: \"lo\"\n"], IFTABLE_OID.lstrip(".")))
+    assert rows == {"2.1": "lo"}
+
+
+def test_format_mac():
+    assert format_mac(bytes.fromhex("bc2411000001")) == "BC:24:11:00:00:01"
+    assert format_mac("bc-24-11-0-0-1") == "BC:24:11:00:00:01"
+    assert format_mac("0:1a:2b:3c:4d:5e") == "00:1A:2B:3C:4D:5E"
+
+
+def test_stream_command_parses_canned_walk(tmp_path):
+    fixture = tmp_path / "iftable.walk"
+    fixture.write_text(WALK)
+    rows = dict(stream_command(["cat", str(fixture)], IFTABLE_OID))
+    assert rows["2.2"] == "sfp-sfpplus1"
+    assert rows["6.2"] == bytes.fromhex("001A2B3C4D5E" * 3)
+
+
+def test_stream_command_errors():
+    with pytest.raises(SNMPError, match="Timeout"):
+        list(stream_command(["sh", "-c", "echo 'Timeout: No Response from 10.0.0.1' >&2; exit 1"], IFTABLE_OID))
+    with pytest.raises(SNMPError, match="not installed"):
+        list(stream_command(["snmpbulkwalk-does-not-exist"], IFTABLE_OID))
+
+
+def fake_walker(tmp_path):
+    """A stand-in for snmpbulkwalk that replays the canned walk, or fails for community "bad"."""
+    fixture = tmp_path / "iftable.walk"
+    fixture.write_text(WALK)
+    script = tmp_path / "fake-snmpbulkwalk"
+    script.write_text(
+        "#!/bin/sh\n"
+        'case " $* " in *" bad "*) echo "Timeout: No Response" >&2; exit 1;; esac\n'
+        f"cat '{fixture}'\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_walk_many_reduces_rows_and_isolates_failures(tmp_path):
+    calls = []
+    engine = SNMPEngine(max_workers=4, command=fake_walker(tmp_path), observer=lambda *call: calls.append(call))
+    ok, bad = SNMPTarget("10.0.0.1", "public"), SNMPTarget("10.0.0.2", "bad", 1161)
+
+    def names(key, rows):
+        return {index: value for index, value in rows if index.startswith("2.")}
+
+    results, errors = engine.walk_many([(ok, IFTABLE_OID), (bad, IFTABLE_OID)], handler=names)
+    assert results == {("10.0.0.1", IFTABLE_OID): {"2.1": "lo", "2.2": "sfp-sfpplus1"}}
+    assert list(errors) == [("10.0.0.2", IFTABLE_OID)]
+    assert "Timeout" in errors[("10.0.0.2", IFTABLE_OID)]
+    assert sorted((endpoint, failed) for _, endpoint, _, failed in calls) == [
+        (f"10.0.0.1 {IFTABLE_OID}", False),
+        (f"10.0.0.2 {IFTABLE_OID}", True),
+    ]
+
+
+def test_command_line_names_non_default_port():
+    engine = SNMPEngine(max_repetitions=50, timeout=3)
+    assert engine.command_line(SNMPTarget("127.0.0.1", "core-switch", 1161), IFTABLE_OID) == [
+        "snmpbulkwalk", "-v2c", "-On", "-Cr50", "-t", "3", "-r", "1", "-c", "core-switch", "udp:127.0.0.1:1161", IFTABLE_OID,
+    ]
+    assert engine.command_line(SNMPTarget("10.0.0.1", "public"), IFTABLE_OID)[-2] == "10.0.0.1"